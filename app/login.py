@@ -2,18 +2,20 @@ import os
 import time
 from time import sleep
 
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
-from utils.excel_util import list_files_in_output
 from utils.selenium_util import SeleniumUtil
 
 
-def login(
-        _browser: SeleniumUtil,
-        isHaveItem: bool = False,
-) -> None:
+CURRENCY_UPLOAD_URL = "https://me.playerauctions.com/member/batchoffer/?menutype=offer&menusubtype=currencybulkoffertool"
+ITEM_UPLOAD_URL = "https://me.playerauctions.com/member/itemsbulkupload/?menutype=offer&menusubtype=itembulkoffertool"
+
+
+def sign_in(_browser: SeleniumUtil) -> None:
+    """Log in with PA_USERNAME/PA_PASSWORD and wait until the captcha is solved."""
     _browser.get(
         "https://www.playerauctions.com/wow-classic-gold/?Serverid=13563&Quantity=6000&PageIndex=1"
     )
@@ -51,51 +53,42 @@ def login(
             time.sleep(3)
         except Exception:
             break
-    ### upload currency file
-    for file in list_files_in_output('storage/output/currency'):
-        sendCurrencyFile(_browser, file)
-        print(f"Uploaded")
-        time.sleep(30)
 
-    if isHaveItem:
-        ### upload item file
-        for file in list_files_in_output('storage/output/item'):
-            sendItemFile(_browser, file)
-            print(f"Uploaded")
-            time.sleep(30)
 
-    _browser.close()
+def is_login_page(_browser: SeleniumUtil) -> bool:
+    return "login" in _browser.driver.current_url.lower()
 
 
-def sendCurrencyFile(_browser: SeleniumUtil, path: str) -> None:
-    _browser.get(
-        "https://me.playerauctions.com/member/batchoffer/?menutype=offer&menusubtype=currencybulkoffertool"
-    )
+def open_bulk_tool(_browser: SeleniumUtil, url: str, timeout: float = 10) -> bool:
+    """
+    Open a bulk offer tool and wait for its file input.
 
-    file_path = os.path.abspath(path)
+    :return: False when the session was sent back to the login page instead.
+    """
+    _browser.get(url)
+    try:
+        WebDriverWait(_browser.driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file']"))
+        )
+    except TimeoutException:
+        if is_login_page(_browser):
+            return False
+        raise
+    return not is_login_page(_browser)
 
-    file_input = WebDriverWait(_browser.driver, 10).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file']"))
-    )
-    # Upload the file using the absolute path
-    file_input.send_keys(file_path)
 
-    # Optionally, you can click the "BROWSE FILES" button if needed
-    browse_button = _browser.driver.find_element(By.CSS_SELECTOR, "input.ant-checkbox-input")
-    browse_button.click()
-    _browser.click_by_inner_text("UPLOAD")
+def send_bulk_file(_browser: SeleniumUtil, url: str, path: str) -> bool:
+    """
+    Upload a file with the bulk offer tool at ``url``.
 
-
-def sendItemFile(_browser: SeleniumUtil, path: str) -> None:
-    _browser.get(
-        "https://me.playerauctions.com/member/itemsbulkupload/?menutype=offer&menusubtype=itembulkoffertool"
-    )
+    :return: False when the session was sent back to the login page and nothing was uploaded.
+    """
+    if not open_bulk_tool(_browser, url):
+        return False
 
     file_path = os.path.abspath(path)
 
-    file_input = WebDriverWait(_browser.driver, 10).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file']"))
-    )
+    file_input = _browser.driver.find_element(By.CSS_SELECTOR, "input[type='file']")
     # Upload the file using the absolute path
     file_input.send_keys(file_path)
 
@@ -103,8 +96,12 @@ def sendItemFile(_browser: SeleniumUtil, path: str) -> None:
     browse_button = _browser.driver.find_element(By.CSS_SELECTOR, "input.ant-checkbox-input")
     browse_button.click()
     _browser.click_by_inner_text("UPLOAD")
+    return True
+
+
+def sendCurrencyFile(_browser: SeleniumUtil, path: str) -> bool:
+    return send_bulk_file(_browser, CURRENCY_UPLOAD_URL, path)
 
 
-if __name__ == "__main__":
-    browser = SeleniumUtil(mode=1)
-    login(browser)
+def sendItemFile(_browser: SeleniumUtil, path: str) -> bool:
+    return send_bulk_file(_browser, ITEM_UPLOAD_URL, path)
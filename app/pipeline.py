@@ -0,0 +1,107 @@
+import contextvars
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+def get_stage_workers(env_name: str, default: int = 1) -> int:
+    try:
+        return max(1, int(os.getenv(env_name)))
+    except Exception:
+        return default
+
+
+class Pipeline:
+    """
+    Run items through stages connected by bounded queues.
+
+    Every stage has its own worker threads. A stage function returns the item
+    to hand to the next stage, or None to drop it. The first exception raised
+    by a stage function stops the pipeline (remaining items are drained
+    without being processed) and is re-raised from run().
+    """
+
+    def __init__(self, stages: list[Stage], queue_size: int = 4) -> None:
+        self.stages = stages
+        self.queue_size = queue_size
+        self._queues: list[queue.Queue] = []
+        self._remaining: list[int] = []
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._error: BaseException | None = None
+
+    def _put(self, stage_index: int, item: Any) -> None:
+        self._queues[stage_index].put(item)
+
+    def _fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._abort.set()
+
+    def _worker(self, stage_index: int) -> None:
+        stage = self.stages[stage_index]
+        is_last = stage_index == len(self.stages) - 1
+        while True:
+            item = self._queues[stage_index].get()
+            if item is _STOP:
+                break
+            if self._abort.is_set():
+                continue
+            try:
+                result = stage.func(item)
+            except BaseException as e:
+                print(f"Stage {stage.name} failed: {e}")
+                self._fail(e)
+                continue
+            if result is not None and not is_last:
+                self._put(stage_index + 1, result)
+
+        with self._lock:
+            self._remaining[stage_index] -= 1
+            is_stage_done = self._remaining[stage_index] == 0
+        if is_stage_done and not is_last:
+            for _ in range(self.stages[stage_index + 1].workers):
+                self._put(stage_index + 1, _STOP)
+
+    def run(self, items: Iterable[Any]) -> None:
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self._remaining = [stage.workers for stage in self.stages]
+        self._abort.clear()
+        self._error = None
+
+        threads = []
+        for stage_index, stage in enumerate(self.stages):
+            for worker_index in range(stage.workers):
+                # Workers see the caller's context variables (e.g. its retry budget)
+                thread = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._worker, stage_index),
+                    name=f"{stage.name}-{worker_index}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            if self._abort.is_set():
+                break
+            self._put(0, item)
+        for _ in range(self.stages[0].workers):
+            self._put(0, _STOP)
+
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
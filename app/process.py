@@ -5,7 +5,8 @@ from typing import Any, Optional, Tuple, List
 
 import gspread
 
-from decorator.retry import retry
+import constants
+from decorator.retry import bind_retry_budget, retry
 from decorator.time_execution import time_execution
 from model.crawl_model import G2GOfferItem, OfferItem, DeliveryTime, FUNOfferItem, StockNumInfo
 from model.enums import StockType
@@ -13,13 +14,15 @@ from model.payload import PriceInfo, Row
 from model.sheet_model import G2G, Product, StockInfo
 from utils.biji_extract import bij_lowest_price
 from utils.common_utils import getCNYRate
-from utils.dd_utils import DD373Product, get_dd_min_price
+from utils.dd_utils import DD373Product, get_dd_min_price, get_dd373_listings
 from utils.fun_extract import fun_extract_offer_items
 from utils.g2g_extract import g2g_extract_offer_items
 from utils.ggsheet import (
     GSheet,
 )
-from utils.selenium_util import SeleniumUtil
+from utils import async_fetch, metrics
+from utils.page_cache import cached_offers
+from utils.selenium_util import SeleniumPools
 
 
 def get_row_run_index(
@@ -38,7 +41,7 @@ def get_row_run_index(
 def is_valid_offer_item(
         product: Product,
         offer_item: OfferItem,
-        black_list: list[str],
+        black_list: frozenset[str],
 ) -> bool:
     product_delivery_time = DeliveryTime.from_text(product.DELIVERY_TIME)
     if (
@@ -64,7 +67,7 @@ def is_valid_offer_item(
 def filter_valid_offer_items(
         product: Product,
         offer_items: list[OfferItem],
-        black_list: list[str],
+        black_list: frozenset[str],
 ) -> list[OfferItem]:
     return [
         offer_item
@@ -76,7 +79,7 @@ def filter_valid_offer_items(
 def is_change_price(
         product: Product,
         offer_items: list[OfferItem],
-        black_list: list[str],
+        black_list: frozenset[str],
 ) -> bool:
     if product.CHECK == 0:
         return False
@@ -204,15 +207,14 @@ def identify_stock(
 #     ), [g2g_min_price, fun_min_price, bij_min_price]
 #
 
-@time_execution
 @retry(retries=3, delay=0.25, exception=Exception)
 def calculate_price_change(
         gsheet: GSheet,
         row: Row,
         offer_items: list[OfferItem],
         BIJ_HOST_DATA: dict,
-        selenium: SeleniumUtil,
-        black_list: list[str],
+        browser_pools: SeleniumPools,
+        black_list: frozenset[str],
 ) -> tuple[None, None] | tuple[PriceInfo, None] | None | tuple[PriceInfo, list[tuple[float, str] | None]]:
     stock_type, stock_num_info = identify_stock(
         gsheet,
@@ -285,7 +287,7 @@ def calculate_price_change(
 
     elif stock_type is StockType.stock_fake:
         stock_fake_price_tuple, stock_fake_items = calculate_price_stock_fake(
-            gsheet=gsheet, row=row, quantity=min_offer_item.quantity, hostdata=BIJ_HOST_DATA, selenium=selenium
+            gsheet=gsheet, row=row, quantity=min_offer_item.quantity, hostdata=BIJ_HOST_DATA, browser_pools=browser_pools
         )
         if stock_fake_price_tuple is None or stock_fake_price_tuple[0] <= 0:  # Ensure valid price
             # print("Stock fake price is None or not positive.")
@@ -466,7 +468,7 @@ def get_closest_offer_item(
         sorted_offer_items: list[OfferItem],
         price: float,
         profit: float,
-        black_list: list[str]
+        black_list: frozenset[str]
 ):
     if len(sorted_offer_items) >= 1:
         if price < sorted_offer_items[0].price:
@@ -491,10 +493,38 @@ def get_closest_offer_item(
     return adjusted_item.price, adjusted_item.seller.name
 
 
+def _get_g2g_offer_items(url: str) -> list[G2GOfferItem]:
+    def fetch():
+        if async_fetch.get_competitor_fetch_mode() == "async":
+            return async_fetch.g2g_offer_items(url)
+        return g2g_extract_offer_items(url)
+
+    return cached_offers("g2g", url, fetch)
+
+
+def _get_fun_offer_items(url: str, filters: list[str]) -> list[FUNOfferItem]:
+    def fetch():
+        if async_fetch.get_competitor_fetch_mode() == "async":
+            return async_fetch.fun_offer_items(url, filters)
+        return fun_extract_offer_items(url, filters)
+
+    return cached_offers("fun", url, fetch, filters)
+
+
+def _get_dd_listings(url: str) -> list[DD373Product]:
+    def fetch():
+        if async_fetch.get_competitor_fetch_mode() == "async":
+            return async_fetch.dd373_listings(url)
+        return get_dd373_listings(url)
+
+    return cached_offers("dd", url, fetch)
+
+
+@metrics.timed("source", source="g2g")
 def _process_g2g(row: Row, gsheet: GSheet) -> Optional[Tuple[float, str]]:
     try:
         print("Starting G2G fetch...")
-        g2g_offer_items = g2g_extract_offer_items(row.g2g.G2G_PRODUCT_COMPARE)
+        g2g_offer_items = _get_g2g_offer_items(row.g2g.G2G_PRODUCT_COMPARE)
         filtered_g2g_offer_items = G2GOfferItem.filter_valid_g2g_offer_item(
             g2g=row.g2g,
             g2g_blacklist=row.g2g.get_blacklist(gsheet),
@@ -513,22 +543,22 @@ def _process_g2g(row: Row, gsheet: GSheet) -> Optional[Tuple[float, str]]:
             return None
     except Exception as e:
         print(f"Error processing G2G: {e}")
+        metrics.inc("source_failures_total", source="g2g")
         return None
 
 
+@metrics.timed("source", source="fun")
 def _process_fun(row: Row, gsheet: GSheet) -> Optional[Tuple[float, str]]:
     try:
         print("Starting FUN fetch...")
-        fun_offer_items = fun_extract_offer_items(
-            row.fun.FUN_PRODUCT_COMPARE,
-            [
-                i
-                for i in [
+        fun_filters = [
+            i
+            for i in [
                 row.fun.FUN_FILTER21, row.fun.FUN_FILTER22,
                 row.fun.FUN_FILTER23, row.fun.FUN_FILTER24,
             ] if i is not None
-            ],
-        )
+        ]
+        fun_offer_items = _get_fun_offer_items(row.fun.FUN_PRODUCT_COMPARE, fun_filters)
         filtered_fun_offer_items = FUNOfferItem.filter_valid_fun_offer_items(
             fun=row.fun,
             fun_offer_items=fun_offer_items,
@@ -549,10 +579,12 @@ def _process_fun(row: Row, gsheet: GSheet) -> Optional[Tuple[float, str]]:
             return None
     except Exception as e:
         print(f"Error processing FUN: {e}")
+        metrics.inc("source_failures_total", source="fun")
         return None
 
 
-def _process_bij(row: Row, gsheet: GSheet, hostdata: dict, selenium: SeleniumUtil) -> Optional[Tuple[float, str]]:
+@metrics.timed("source", source="bij")
+def _process_bij(row: Row, gsheet: GSheet, hostdata: dict, browser_pools: SeleniumPools) -> Optional[Tuple[float, str]]:
     try:
         print("Starting BIJ fetch...")
         CNY_RATE = getCNYRate()
@@ -560,7 +592,8 @@ def _process_bij(row: Row, gsheet: GSheet, hostdata: dict, selenium: SeleniumUti
         bij_min_offer_item = None
         for attempt in range(2):
             try:
-                bij_min_offer_item = bij_lowest_price(hostdata, selenium, row.bij, black_list=_black_list)
+                with browser_pools.checkout(constants.DEFAULT_URL) as selenium:
+                    bij_min_offer_item = bij_lowest_price(hostdata, selenium, row.bij, black_list=_black_list)
                 break
             except Exception as e:
                 print(f"Attempt {attempt + 1} failed for BIJ. Error: {e}")
@@ -580,9 +613,11 @@ def _process_bij(row: Row, gsheet: GSheet, hostdata: dict, selenium: SeleniumUti
             return None
     except Exception as e:
         print(f"Error processing BIJ: {e}")
+        metrics.inc("source_failures_total", source="bij")
         return None
 
 
+@metrics.timed("source", source="sheet1")
 def _process_price1_sheet(row: Row) -> Optional[Tuple[float, str]]:
     try:
         print("Starting SheetPrice1 sheet...")
@@ -602,9 +637,11 @@ def _process_price1_sheet(row: Row) -> Optional[Tuple[float, str]]:
         return None
     except Exception as e:
         print(f"Error processing PRICE1: {e}")
+        metrics.inc("source_failures_total", source="sheet1")
         return None
 
 
+@metrics.timed("source", source="sheet2")
 def _process_price2_sheet(row: Row) -> Optional[Tuple[float, str]]:
     try:
         print("Starting SheetPrice2 sheet...")
@@ -624,9 +661,11 @@ def _process_price2_sheet(row: Row) -> Optional[Tuple[float, str]]:
         return None
     except Exception as e:
         print(f"Error processing SheetPrice2: {e}")
+        metrics.inc("source_failures_total", source="sheet2")
         return None
 
 
+@metrics.timed("source", source="sheet3")
 def _process_price3_sheet(row: Row) -> Optional[Tuple[float, str]]:
     try:
         print("Starting PRICE3 sheet...")
@@ -646,9 +685,11 @@ def _process_price3_sheet(row: Row) -> Optional[Tuple[float, str]]:
         return None
     except Exception as e:
         print(f"Error processing SheetPrice3: {e}")
+        metrics.inc("source_failures_total", source="sheet3")
         return None
 
 
+@metrics.timed("source", source="sheet4")
 def _process_price4_sheet(row: Row) -> Optional[Tuple[float, str]]:
     try:
         print("Starting SheetPrice4 sheet...")
@@ -668,16 +709,18 @@ def _process_price4_sheet(row: Row) -> Optional[Tuple[float, str]]:
         return None
     except Exception as e:
         print(f"Error processing SheetPrice4: {e}")
+        metrics.inc("source_failures_total", source="sheet4")
         return None
 
 
+@metrics.timed("source", source="dd")
 def _process_dd(row: Row, gsheet: GSheet) -> Optional[Tuple[float, str]]:
     try:
         print("Starting DD fetch...")
         dd_min_offer_item = None
         for attempt in range(2):
             try:
-                dd_min_offer_item = get_dd_min_price(row.dd)
+                dd_min_offer_item = get_dd_min_price(row.dd, _get_dd_listings(row.dd.DD_PRODUCT_COMPARE))
                 break
             except Exception as e:
                 print(f"Attempt {attempt + 1} failed for DD. Error: {e}")
@@ -687,6 +730,7 @@ def _process_dd(row: Row, gsheet: GSheet) -> Optional[Tuple[float, str]]:
         return dd_min_offer_item
     except Exception as e:
         print(f"Error processing DD: {e}")
+        metrics.inc("source_failures_total", source="dd")
         return None
 
 
@@ -697,7 +741,7 @@ def calculate_price_stock_fake(
         row: Row,
         quantity: int,  # Biến này không được sử dụng trong logic gốc? Vẫn giữ lại param.
         hostdata: dict,
-        selenium: SeleniumUtil,
+        browser_pools: SeleniumPools,
 ) -> Tuple[Optional[Tuple[float, str]], List[Optional[Tuple[float, str]]]]:  # Trả về tuple(min_price, list_all_prices)
 
     g2g_future = None
@@ -717,37 +761,37 @@ def calculate_price_stock_fake(
         # Submit G2G task
         if row.g2g.G2G_CHECK == 1:
             print("Submitting G2G task...")
-            g2g_future = executor.submit(_process_g2g, row, gsheet)
+            g2g_future = executor.submit(bind_retry_budget(_process_g2g), row, gsheet)
 
         # Submit FUN task
         if row.fun.FUN_CHECK == 1:
             print("Submitting FUN task...")
-            fun_future = executor.submit(_process_fun, row, gsheet)
+            fun_future = executor.submit(bind_retry_budget(_process_fun), row, gsheet)
 
         # Submit BIJ task
         if row.bij.BIJ_CHECK == 1:
             print("Submitting BIJ task...")
-            bij_future = executor.submit(_process_bij, row, gsheet, hostdata, selenium)
+            bij_future = executor.submit(bind_retry_budget(_process_bij), row, gsheet, hostdata, browser_pools)
 
         if row.dd.DD_CHECK == 1:
             print("Submitting DD task...")
-            dd_future = executor.submit(_process_dd, row, gsheet)
+            dd_future = executor.submit(bind_retry_budget(_process_dd), row, gsheet)
 
         if row.s1.SHEET_CHECK == 1:
             print("Submitting SheetPrice1 task...")
-            s1_future = executor.submit(_process_price1_sheet, row)
+            s1_future = executor.submit(bind_retry_budget(_process_price1_sheet), row)
 
         if row.s2.SHEET_CHECK == 1:
             print("Submitting SheetPrice2 task...")
-            s2_future = executor.submit(_process_price2_sheet, row)
+            s2_future = executor.submit(bind_retry_budget(_process_price2_sheet), row)
 
         if row.s3.SHEET_CHECK == 1:
             print("Submitting SheetPrice3 task...")
-            s3_future = executor.submit(_process_price3_sheet, row)
+            s3_future = executor.submit(bind_retry_budget(_process_price3_sheet), row)
 
         if row.s4.SHEET_CHECK == 1:
             print("Submitting SheetPrice4 task...")
-            s4_future = executor.submit(_process_price4_sheet, row)
+            s4_future = executor.submit(bind_retry_budget(_process_price4_sheet), row)
 
 
         if g2g_future:
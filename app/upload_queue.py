@@ -0,0 +1,244 @@
+import itertools
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+import constants
+from app.uploader import Uploader, get_uploader
+from utils import metrics
+from utils.output_generations import current_output_files
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 30
+UPLOAD_KINDS = ("currency", "item")
+
+
+@dataclass
+class UploadBatch:
+    """
+    The files one cycle generated, linked out of their output generation so
+    they outlive it while they wait.
+
+    ``on_uploaded`` is called once every file of the batch went through; it is
+    not called when a file failed or was superseded by a newer batch.
+    """
+    batch_id: int
+    directory: str
+    files: dict[tuple[str, str], str]
+    on_uploaded: Callable[[], None] | None = None
+    created_at: float = field(default_factory=time.time)
+    remaining: set[tuple[str, str]] = field(default_factory=set)
+    complete: bool = True
+
+
+@dataclass
+class _PendingFile:
+    batch: UploadBatch
+    key: tuple[str, str]
+    path: str
+    attempts: int = 0
+    # time.monotonic() before which a failed file is not tried again
+    retry_at: float = 0
+
+
+class UploadQueue:
+    """
+    Uploads generated bulk files on a background thread, so the next cycle can
+    crawl and price while the bulk tool is busy.
+
+    Files are queued per (kind, game). A file whose game still waits for its
+    upload is replaced by the newer one in place, so only the latest prices of
+    a game are sent. A failed file is tried again after retry_delay seconds, up
+    to max_attempts times, unless a newer file of its game arrived meanwhile;
+    other files are uploaded while it waits.
+
+    :param uploader: Signed-in browser the files are sent with.
+    :param spool_dir: Where queued batches are kept.
+    :param max_attempts: Tries per file.
+    :param retry_delay: Seconds to wait after a failed upload.
+    """
+
+    def __init__(
+            self,
+            uploader: Uploader,
+            spool_dir: str = constants.UPLOAD_SPOOL_PATH,
+            max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+            retry_delay: float = DEFAULT_RETRY_DELAY,
+    ) -> None:
+        self.uploader = uploader
+        self.spool_dir = spool_dir
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._pending: OrderedDict[tuple[str, str], _PendingFile] = OrderedDict()
+        self._in_flight = 0
+        self._closed = False
+        self._thread: threading.Thread | None = None
+        # Batches left behind by a previous run were never uploaded
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="upload-queue", daemon=True)
+            self._thread.start()
+
+    def submit(self, is_have_item: bool, on_uploaded: Callable[[], None] | None = None) -> UploadBatch | None:
+        """
+        Queue the files of the current output generation: the currency files,
+        and the item files when there are items.
+
+        :return: The queued batch, or None when there was nothing to upload.
+        """
+        batch_id = next(self._ids)
+        directory = os.path.join(self.spool_dir, str(batch_id))
+        files: dict[tuple[str, str], str] = {}
+        for kind in UPLOAD_KINDS:
+            if kind == "item" and not is_have_item:
+                continue
+            for file in current_output_files(kind):
+                os.makedirs(os.path.join(directory, kind), exist_ok=True)
+                path = os.path.join(directory, kind, os.path.basename(file))
+                try:
+                    # Generations are never rewritten, so a link is as good as a copy
+                    os.link(file, path)
+                except OSError:
+                    shutil.copy2(file, path)
+                files[(kind, os.path.basename(file))] = path
+        if not files:
+            if on_uploaded is not None:
+                on_uploaded()
+            return None
+        batch = UploadBatch(batch_id, directory, files, on_uploaded, remaining=set(files))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Upload queue is closed")
+            superseded = []
+            for key, path in files.items():
+                previous = self._pending.get(key)
+                if previous is not None:
+                    superseded.append(previous)
+                # An existing key keeps its place in the queue
+                self._pending[key] = _PendingFile(batch, key, path)
+            for previous in superseded:
+                print(f"Upload of {previous.path} superseded by batch {batch_id}")
+                metrics.inc("uploads_superseded_total", kind=previous.key[0])
+                previous.batch.complete = False
+                self._finish_locked(previous)
+            metrics.inc("upload_batches_total")
+            self._start()
+            self._cond.notify_all()
+        print(f"Queued upload batch {batch_id}: {len(files)} files")
+        return batch
+
+    def _finish_locked(self, pending: _PendingFile) -> None:
+        batch = pending.batch
+        batch.remaining.discard(pending.key)
+        if batch.remaining:
+            return
+        shutil.rmtree(batch.directory, ignore_errors=True)
+        if batch.complete:
+            metrics.observe("upload_batch_latency_seconds", time.time() - batch.created_at)
+            if batch.on_uploaded is not None:
+                try:
+                    batch.on_uploaded()
+                except Exception as e:
+                    print(f"Error after upload batch {batch.batch_id}: {e}")
+
+    def _next_locked(self) -> _PendingFile | None:
+        """Wait for the first queued file that is not waiting for a retry; None once closed."""
+        while True:
+            if self._closed and not self._pending:
+                return None
+            now = time.monotonic()
+            for key, pending in self._pending.items():
+                if pending.retry_at <= now:
+                    del self._pending[key]
+                    return pending
+            # Woken early by submit and close
+            timeout = min(pending.retry_at for pending in self._pending.values()) - now if self._pending else None
+            self._cond.wait(timeout)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                pending = self._next_locked()
+                if pending is None:
+                    return
+                self._in_flight += 1
+            pending.attempts += 1
+            kind = pending.key[0]
+            try:
+                self.uploader.upload_file(pending.path, is_item=kind == "item")
+                error = None
+            except Exception as e:
+                error = e
+            with self._cond:
+                self._in_flight -= 1
+                if error is None:
+                    metrics.inc("uploads_total", kind=kind, outcome="ok")
+                    self._finish_locked(pending)
+                elif pending.key in self._pending:
+                    print(f"Error uploading {pending.path}, a newer file replaces it: {error}")
+                    metrics.inc("uploads_total", kind=kind, outcome="superseded")
+                    pending.batch.complete = False
+                    self._finish_locked(pending)
+                elif pending.attempts >= self.max_attempts or self._closed:
+                    print(f"Error uploading {pending.path}, giving up after {pending.attempts} attempts: {error}")
+                    metrics.inc("uploads_total", kind=kind, outcome="failed")
+                    pending.batch.complete = False
+                    self._finish_locked(pending)
+                else:
+                    print(f"Error uploading {pending.path} (attempt {pending.attempts}), retrying: {error}")
+                    metrics.inc("uploads_total", kind=kind, outcome="retry")
+                    pending.retry_at = time.monotonic() + self.retry_delay
+                    self._pending[pending.key] = pending
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until every queued file was uploaded or dropped."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Finish the file in flight, drop the rest and stop the worker."""
+        with self._cond:
+            self._closed = True
+            for pending in self._pending.values():
+                pending.batch.complete = False
+                self._finish_locked(pending)
+            self._pending.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def get_upload_mode() -> str:
+    """UPLOAD_MODE: "background" (default) queues uploads, "sync" uploads before the cycle ends."""
+    mode = os.getenv("UPLOAD_MODE", "background").strip().lower()
+    return mode if mode in ("background", "sync") else "background"
+
+
+_queue_lock = threading.Lock()
+_queue: UploadQueue | None = None
+
+
+def get_upload_queue() -> UploadQueue:
+    """The process-wide queue, configured by UPLOAD_MAX_ATTEMPTS and UPLOAD_RETRY_DELAY."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            try:
+                max_attempts = int(os.getenv("UPLOAD_MAX_ATTEMPTS"))
+            except Exception:
+                max_attempts = DEFAULT_MAX_ATTEMPTS
+            try:
+                retry_delay = float(os.getenv("UPLOAD_RETRY_DELAY"))
+            except Exception:
+                retry_delay = DEFAULT_RETRY_DELAY
+            _queue = UploadQueue(get_uploader(), max_attempts=max_attempts, retry_delay=retry_delay)
+        return _queue
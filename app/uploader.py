@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+import constants
+from app.login import sign_in, sendCurrencyFile, sendItemFile
+from utils import metrics
+from utils.exceptions import PACrawlerError
+from utils.output_generations import current_output_files
+from utils.selenium_util import SeleniumUtil
+
+# The bulk tool gives no reliable sign that a file was processed, so every file gets a fixed wait
+DEFAULT_UPLOAD_WAIT = 30
+
+
+class Uploader:
+    """
+    One windowed browser kept signed in to PlayerAuctions across cycles. Its
+    Chrome profile lives in ``user_data_dir``, so the session also survives a
+    restart; the login form is only filled in when the bulk tool sends us back
+    to the login page.
+
+    :param user_data_dir: Chrome profile directory.
+    :param upload_wait: Seconds to wait after each file for the bulk tool to process it.
+    """
+
+    def __init__(
+            self,
+            user_data_dir: str = constants.UPLOADER_PROFILE_PATH,
+            upload_wait: float = DEFAULT_UPLOAD_WAIT,
+    ) -> None:
+        self.user_data_dir = user_data_dir
+        self.upload_wait = upload_wait
+        self.browser: SeleniumUtil | None = None
+        self._lock = threading.Lock()
+
+    def _get_browser(self) -> SeleniumUtil:
+        if self.browser is None or not self.browser.is_healthy():
+            self._close_browser()
+            os.makedirs(self.user_data_dir, exist_ok=True)
+            self.browser = SeleniumUtil(mode=1, user_data_dir=self.user_data_dir)
+        return self.browser
+
+    def _close_browser(self) -> None:
+        if self.browser is None:
+            return
+        try:
+            self.browser.close()
+        except Exception as e:
+            print(f"Error closing uploader browser: {e}")
+        self.browser = None
+
+    def _sign_in(self, browser: SeleniumUtil) -> None:
+        print("Uploader session expired, logging in")
+        metrics.inc("uploader_logins_total")
+        with metrics.span("uploader_login"):
+            sign_in(browser)
+
+    def _send(self, send_file, path: str) -> None:
+        browser = self._get_browser()
+        with metrics.span("upload_file", details={"file": os.path.basename(path)}):
+            # The session is only checked by the bulk tool itself redirecting to the login page
+            if not send_file(browser, path):
+                self._sign_in(browser)
+                if not send_file(browser, path):
+                    raise PACrawlerError("Still not signed in after logging in")
+            time.sleep(self.upload_wait)
+        print(f"Uploaded {path}")
+
+    def upload_file(self, path: str, is_item: bool) -> None:
+        """Upload one currency or item bulk file."""
+        with self._lock:
+            try:
+                self._send(sendItemFile if is_item else sendCurrencyFile, path)
+            except Exception:
+                # Start from a fresh browser next time, the profile keeps the session
+                self._close_browser()
+                raise
+
+    def upload(self, is_have_item: bool) -> None:
+        """Upload the current output generation: its currency files, and its item files when there are items."""
+        for file in current_output_files("currency"):
+            self.upload_file(file, is_item=False)
+        if is_have_item:
+            for file in current_output_files("item"):
+                self.upload_file(file, is_item=True)
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_browser()
+
+
+_uploader_lock = threading.Lock()
+_uploader: Uploader | None = None
+
+
+def get_uploader() -> Uploader:
+    """The process-wide uploader, configured by UPLOADER_PROFILE_DIR and UPLOAD_WAIT."""
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            try:
+                upload_wait = float(os.getenv("UPLOAD_WAIT"))
+            except Exception:
+                upload_wait = DEFAULT_UPLOAD_WAIT
+            _uploader = Uploader(
+                user_data_dir=os.getenv("UPLOADER_PROFILE_DIR") or constants.UPLOADER_PROFILE_PATH,
+                upload_wait=upload_wait,
+            )
+        return _uploader
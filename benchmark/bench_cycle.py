@@ -0,0 +1,169 @@
+"""
+Replay whole cycles offline through main.process and report where the time
+goes: recorded offer pages are served by a local HTTP server, the main
+worksheet and the referenced min/max/stock/blacklist/CNY cells come from a
+recorded grid, BIJ is answered from a recorded price table and uploads take a
+fixed delay instead of driving the bulk tool. Everything else is the code
+that ships (pipeline stages, competitor fetchers, incremental mode, output
+generations, upload queue); stage timings are its own metrics spans.
+
+Run from the repository root:
+    python -m benchmark.bench_cycle [--cycles 5] [--rows 40] [--http-latency-ms 0] [--sheets-latency-ms 0]
+        [--upload-latency-ms 0] [--upload-mode background|sync] [--incremental]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+from collections import defaultdict
+
+from gspread.utils import a1_to_rowcol
+
+import app.process
+import app.upload_queue
+import app.uploader
+import constants
+import main as pa_main
+from app.upload_queue import UploadQueue
+from benchmark.fakes import RecordedWorksheet, RecordedSheetsService, RecordedBrowserPools, RecordedGSheet, \
+    ReplayUploader, make_bij_replay
+from benchmark.stub_server import FixtureServer, FIXTURES_DIR
+from utils import metrics, output_generations
+from utils.bij_host_index import load_bij_host_index
+from utils.google_api import set_sheets_service
+
+# Report order; spans not listed here follow in alphabetical order
+STAGES = [
+    "sheet_read",
+    "reference_prefetch",
+    "pa_fetch",
+    "fetch",
+    "parse",
+    "source",
+    "calculate_price_stock_fake",
+    "price",
+    "log_write",
+    "template_write",
+    "upload",
+    "upload_file",
+    "process",
+    "cycle",
+    "upload_drain",
+]
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def load_recorded_grid(base_url: str, rows: int) -> tuple[dict[tuple[int, int], str], dict]:
+    """
+    Lay the recorded rows out from row 2 on (row 1 is the header), repeated up to
+    ``rows`` rows, with {base_url} pointing at the fixture server.
+    """
+    with open(os.path.join(FIXTURES_DIR, "sheet_grid.json"), encoding="utf-8") as file:
+        grid = json.load(file)
+    cells: dict[tuple[int, int], str] = {}
+    for column, value in grid["header"].items():
+        cells[a1_to_rowcol(f"{column}1")] = value
+    recorded_rows = grid["rows"]
+    for offset in range(rows):
+        for column, value in recorded_rows[offset % len(recorded_rows)].items():
+            cells[a1_to_rowcol(f"{column}{offset + 2}")] = value.replace("{base_url}", base_url)
+    return cells, grid["references"]
+
+
+def read_span_samples(metrics_path: str) -> dict[str, list[float]]:
+    """Durations of the span events in the metrics file, by span name (and source label)."""
+    samples: dict[str, list[float]] = defaultdict(list)
+    with open(metrics_path, encoding="utf-8") as file:
+        for line in file:
+            event = json.loads(line)
+            if event.get("type") != "span":
+                continue
+            source = event.get("labels", {}).get("source")
+            stage = f"{event['name']}[{source}]" if source else event["name"]
+            samples[stage].append(event["duration"])
+    return samples
+
+
+def print_report(samples: dict[str, list[float]], cycles: int, worksheet: RecordedWorksheet,
+                 service: RecordedSheetsService, uploader: ReplayUploader):
+    print(f"cycles: {cycles}, worksheet calls: {worksheet.calls}, sheets api calls: {service.calls}, "
+          f"uploaded files: {uploader.files}")
+    print(f"{'stage':<28} {'calls':>6} {'total s':>9} {'calls/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+
+    def order(stage: str):
+        name = stage.split("[")[0]
+        return (STAGES.index(name) if name in STAGES else len(STAGES), stage)
+
+    for stage in sorted(samples, key=order):
+        stage_samples = samples[stage]
+        total = sum(stage_samples)
+        throughput = len(stage_samples) / total if total > 0 else float("inf")
+        print(f"{stage:<28} {len(stage_samples):>6} {total:>9.3f} {throughput:>9.1f} "
+              f"{percentile(stage_samples, 50) * 1000:>9.2f} {percentile(stage_samples, 95) * 1000:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=40, help="Rows in the replayed sheet (recorded rows repeated)")
+    parser.add_argument("--http-latency-ms", type=float, default=0, help="Delay added to every page response")
+    parser.add_argument("--sheets-latency-ms", type=float, default=0, help="Delay added to every Sheets call")
+    parser.add_argument("--upload-latency-ms", type=float, default=0, help="Time one file upload takes")
+    parser.add_argument("--upload-mode", choices=["background", "sync"], default="background")
+    parser.add_argument("--incremental", action="store_true", help="Run with INCREMENTAL_MODE on")
+    parser.add_argument("--verbose", action="store_true", help="Keep the output of the replayed code")
+    args = parser.parse_args()
+
+    with FixtureServer(latency=args.http_latency_ms / 1000) as server, \
+            tempfile.TemporaryDirectory() as output_dir:
+        os.environ.update({
+            "PA_FETCH_MODE": "http",
+            "SPREADSHEET_ID": "bench-sheet",
+            "SHEET_NAME": "bench",
+            "CNY_RATE_SPREADSHEET_ID": "bench-rates",
+            "CNY_RATE_SHEET_NAME": "CNY",
+            "CNY_RATE_CELL": "A2",
+            "UPLOAD_MODE": args.upload_mode,
+            "INCREMENTAL_MODE": "1" if args.incremental else "0",
+            "PRICE_HISTORY_PATH": os.path.join(output_dir, "price_history.sqlite3"),
+            "METRICS_FILE": os.path.join(output_dir, "metrics.jsonl"),
+        })
+        # A registry that writes to the file above, whatever was used before
+        metrics.registry = metrics.MetricsRegistry()
+        # Keep the benchmark's CNY rate and output files out of storage/
+        constants.CNY_RATE_PATH = os.path.join(output_dir, "cny_rate.json")
+        output_generations._generations = output_generations.OutputGenerations(os.path.join(output_dir, "output"))
+
+        cells, references = load_recorded_grid(server.base_url, args.rows)
+        worksheet = RecordedWorksheet(cells, latency=args.sheets_latency_ms / 1000)
+        service = RecordedSheetsService(references, latency=args.sheets_latency_ms / 1000)
+        set_sheets_service(service)
+        with open(os.path.join(FIXTURES_DIR, "bij_table.html"), encoding="utf-8") as file:
+            app.process.bij_lowest_price = make_bij_replay(file.read())
+        hostdata = load_bij_host_index(index_path=os.path.join(output_dir, "hosts.sqlite3"))
+        browser_pools = RecordedBrowserPools()
+        uploader = ReplayUploader(latency=args.upload_latency_ms / 1000)
+        app.uploader._uploader = uploader
+        upload_queue = app.upload_queue._queue = UploadQueue(uploader, spool_dir=os.path.join(output_dir, "spool"))
+
+        for _ in range(args.cycles):
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output, metrics.span("cycle"):
+                pa_main.process(hostdata, RecordedGSheet(worksheet), browser_pools)
+        with metrics.span("upload_drain"):
+            upload_queue.wait_idle()
+        upload_queue.close()
+        samples = read_span_samples(os.environ["METRICS_FILE"])
+
+    print_report(samples, args.cycles, worksheet, service, uploader)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Per-page cost of reading offersModel from a PlayerAuctions page:
+in-process JSON extraction vs. the execjs evaluation it replaces.
+
+Run from the repository root:
+    python -m benchmark.bench_offers_model [iterations]
+"""
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from utils.pa_extract import parse_offers_model, eval_offers_model_execjs
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "pa_offers.html")
+
+
+def _time_per_call(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main(iterations: int = 20):
+    with open(FIXTURE_PATH, encoding="utf-8") as file:
+        html = file.read()
+    soup = BeautifulSoup(html, "html.parser")
+
+    json_result = parse_offers_model(html)
+    execjs_result = eval_offers_model_execjs(soup)
+    if json_result != execjs_result:
+        raise AssertionError("JSON extractor and execjs disagree on offersModel")
+
+    json_cost = _time_per_call(lambda: parse_offers_model(html), iterations)
+    execjs_cost = _time_per_call(lambda: eval_offers_model_execjs(soup), iterations)
+    print(f"offers: {len(json_result)}, iterations: {iterations}")
+    print(f"json extractor: {json_cost * 1000:.3f} ms/page")
+    print(f"execjs:         {execjs_cost * 1000:.3f} ms/page")
+    print(f"speedup:        {execjs_cost / json_cost:.0f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,55 @@
+"""
+Per-page parse cost of every offer extractor over the saved fixture pages,
+next to the cost of only building a full html.parser tree of the same page
+(what each extractor did before its first select).
+
+Run from the repository root:
+    python -m benchmark.bench_parsers [iterations]
+"""
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from utils.dd_utils import parse_dd373_listings
+from utils.fun_extract import fun_extract_offer_items_from_html
+from utils.g2g_extract import g2g_extract_offer_items_from_html
+from utils.html_parser import HTML_PARSER
+from utils.pa_extract import extract_offer_items_from_html
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+FUN_FILTERS = ["server: Firemaw", "side: Horde"]
+
+EXTRACTORS = [
+    ("pa", "pa_offers.html", extract_offer_items_from_html),
+    ("g2g", "g2g_offers.html", g2g_extract_offer_items_from_html),
+    ("fun", "fun_offers.html", lambda html: fun_extract_offer_items_from_html(html, FUN_FILTERS)),
+    ("dd373", "dd373_offers.html", parse_dd373_listings),
+]
+
+
+def _time_per_call(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main(iterations: int = 20):
+    print(f"parser: {HTML_PARSER}, iterations: {iterations}")
+    print(f"{'site':<6} {'offers':>6} {'extract ms/page':>16} {'full tree ms/page':>18}")
+    for site, fixture, extractor in EXTRACTORS:
+        with open(os.path.join(FIXTURES_DIR, fixture), encoding="utf-8") as file:
+            html = file.read()
+        offers = extractor(html)
+        if not offers:
+            raise AssertionError(f"{site}: no offers extracted from {fixture}")
+
+        extract_cost = _time_per_call(lambda: extractor(html), iterations)
+        full_tree_cost = _time_per_call(lambda: BeautifulSoup(html, "html.parser"), iterations)
+        print(f"{site:<6} {len(offers):>6} {extract_cost * 1000:>16.3f} {full_tree_cost * 1000:>18.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,182 @@
+"""
+In-memory stand-ins for the Google Sheets worksheet/API, the BIJ browser and
+the uploader browser, fed from the recorded fixtures.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+from gspread.worksheet import ValueRange
+
+from app.uploader import Uploader
+from model.sheet_model import BIJ
+from utils import metrics
+from utils.biji_extract import get_hostname_by_host_id, bij_offer_items_from_table, select_bij_offer, read_bij_table
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class RecordedWorksheet:
+    """
+    The part of gspread.Worksheet the cycle uses, over a recorded grid.
+
+    :param cells: (row, col) -> value, both 1-based.
+    :param latency: Seconds every API call is delayed by.
+    """
+
+    def __init__(self, cells: dict[tuple[int, int], str], latency: float = 0) -> None:
+        self.cells = cells
+        self.latency = latency
+        self.row_count = max((row for row, _ in cells), default=0)
+        self.col_count = max((col for _, col in cells), default=0)
+        self.calls = 0
+        self.updates: dict[str, str] = {}
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def col_values(self, col: int) -> list[str]:
+        self._call()
+        values = [self.cells.get((row, col), "") for row in range(1, self.row_count + 1)]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def _read_range(self, range_name: str) -> list[list[str]]:
+        grid = a1_range_to_grid_range(range_name)
+        rows = []
+        for row in range(grid.get("startRowIndex", 0) + 1, grid.get("endRowIndex", self.row_count) + 1):
+            values = [self.cells.get((row, col), "")
+                      for col in range(grid.get("startColumnIndex", 0) + 1,
+                                       grid.get("endColumnIndex", self.col_count) + 1)]
+            # The API drops trailing blank cells and rows
+            while values and values[-1] == "":
+                values.pop()
+            rows.append(values)
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def batch_get(self, ranges: list[str], **kwargs) -> list[ValueRange]:
+        self._call()
+        return [
+            ValueRange.from_json({"range": range_name, "majorDimension": "ROWS", "values": self._read_range(range_name)})
+            for range_name in ranges
+        ]
+
+    def batch_update(self, data: list[dict], **kwargs) -> None:
+        self._call()
+        for update in data:
+            self.updates[update["range"]] = update["values"][0][0]
+
+    def update_cell(self, row: int, col: int, value) -> None:
+        self._call()
+        self.updates[rowcol_to_a1(row, col)] = value
+
+
+class RecordedGSheet:
+    """Stands in for GSheet: every spreadsheet opens onto the one recorded worksheet."""
+
+    def __init__(self, worksheet: RecordedWorksheet) -> None:
+        self._worksheet = worksheet
+
+    def get_sheet(self, sheet_id):
+        return self
+
+    def worksheet(self, worksheet_name: str) -> RecordedWorksheet:
+        return self._worksheet
+
+
+class _Request:
+    def __init__(self, execute) -> None:
+        self._execute = execute
+
+    def execute(self):
+        return self._execute()
+
+
+class RecordedSheetsService:
+    """
+    The values().get/batchGet subset of the Sheets v4 service, answering from
+    recorded ranges: {spreadsheet id: {A1 range: values}}.
+    Ranges that were not recorded come back empty, like blank cells.
+    """
+
+    def __init__(self, references: dict[str, dict[str, list[list[str]]]], latency: float = 0) -> None:
+        self.references = references
+        self.latency = latency
+        self.calls = 0
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def _value_range(self, spreadsheet_id: str, range_name: str) -> dict:
+        value_range = {"range": range_name, "majorDimension": "ROWS"}
+        values = self.references.get(spreadsheet_id, {}).get(range_name)
+        if values:
+            value_range["values"] = values
+        return value_range
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def get(self, spreadsheetId: str, range: str, **kwargs) -> _Request:
+        def execute():
+            self._call()
+            return self._value_range(spreadsheetId, range)
+        return _Request(execute)
+
+    def batchGet(self, spreadsheetId: str, ranges: list[str], **kwargs) -> _Request:
+        def execute():
+            self._call()
+            return {"valueRanges": [self._value_range(spreadsheetId, range_name) for range_name in ranges]}
+        return _Request(execute)
+
+
+class RecordedBrowserPools:
+    """Stands in for SeleniumPools; the BIJ lookup is replayed by replay_bij_lowest_price."""
+
+    @contextmanager
+    def checkout(self, url: str, timeout: float | None = None):
+        yield None
+
+    def close(self) -> None:
+        pass
+
+
+def make_bij_replay(html: str):
+    """A drop-in for bij_lowest_price that reads the recorded table instead of driving a browser."""
+
+    def replay_bij_lowest_price(BIJ_HOST_DATA: dict, selenium, data: BIJ, black_list: frozenset[str]):
+        get_hostname_by_host_id(BIJ_HOST_DATA, data.BIJ_NAME)
+        return select_bij_offer(bij_offer_items_from_table(read_bij_table(html)), data, black_list)
+
+    return replay_bij_lowest_price
+
+
+class ReplayUploader(Uploader):
+    """
+    The real Uploader (locking, queue integration) with the browser part of a
+    file upload replaced by a fixed delay.
+
+    :param latency: Seconds one file upload takes.
+    """
+
+    def __init__(self, latency: float = 0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.files = 0
+
+    def _send(self, send_file, path: str) -> None:
+        with metrics.span("upload_file", details={"file": os.path.basename(path)}):
+            if self.latency > 0:
+                time.sleep(self.latency)
+        self.files += 1
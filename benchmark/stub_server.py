@@ -0,0 +1,79 @@
+"""
+Local HTTP server replaying the recorded offer pages, so the real HTTP
+fetchers can be timed without touching the sites.
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# First path segment -> recorded page
+ROUTES = {
+    "pa": "pa_offers.html",
+    "g2g": "g2g_offers.html",
+    "fun": "fun_offers.html",
+    "dd373": "dd373_offers.html",
+}
+
+
+class FixtureServer:
+    """
+    Serve fixtures/<page> for every GET /<route>/... on 127.0.0.1.
+
+    :param latency: Seconds every response is delayed by, to mimic the network.
+    """
+
+    def __init__(self, latency: float = 0) -> None:
+        self.latency = latency
+        self._pages: dict[str, bytes] = {}
+        for route, fixture in ROUTES.items():
+            with open(os.path.join(FIXTURES_DIR, fixture), "rb") as file:
+                self._pages[route] = file.read()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                route = self.path.lstrip("/").split("/", 1)[0]
+                page = server._pages.get(route)
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                if page is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FixtureServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
@@ -2,6 +2,13 @@ import os
 
 KEY_PATH = "key.json"
 DATA_PATH = "storage/output.json"
+OUTPUT_PATH = "storage/output"
+BIJ_HOST_INDEX_PATH = "storage/output_hosts.sqlite3"
+CNY_RATE_PATH = "storage/cny_rate.json"
+METRICS_PATH = "logs/metrics.jsonl"
+PRICE_HISTORY_PATH = "storage/price_history.sqlite3"
+UPLOADER_PROFILE_PATH = "user_data/uploader"
+UPLOAD_SPOOL_PATH = "storage/upload_queue"
 RETRIES_TIME = 20
 DEFAULT_URL = "https://www.bijiaqi.com/"
 
@@ -1,37 +1,252 @@
+import asyncio
+import os
+import random
+import threading
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from functools import wraps
 from selenium.common.exceptions import StaleElementReferenceException
 from typing import TypeVar, Type
 
+from utils import metrics
+
 T = TypeVar("T", bound=Exception)
 
 
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How a decorated function is retried.
+
+    :param retries: Number of attempts before giving up.
+    :param delay: Delay in seconds before the first retry.
+    :param backoff: Factor the delay is multiplied by after every retry (1 = fixed delay).
+    :param max_delay: Upper bound of a single delay, None for no bound.
+    :param jitter: Fraction of the delay that is randomised (0.5 = delay * [0.5, 1.0]).
+    :param exceptions: Exception types to catch and retry on.
+    """
+    retries: int = 20
+    delay: float = 0.25
+    backoff: float = 1
+    max_delay: float | None = None
+    jitter: float = 0
+    exceptions: tuple[Type[BaseException], ...] = (StaleElementReferenceException,)
+
+    def get_delay(self, retry_number: int) -> float:
+        """
+        :param retry_number: 1 for the first retry.
+        """
+        delay = self.delay * self.backoff ** (retry_number - 1)
+        if self.max_delay is not None:
+            delay = min(delay, self.max_delay)
+        if self.jitter > 0:
+            delay *= 1 - random.uniform(0, min(self.jitter, 1))
+        return delay
+
+
+class RetryBudget:
+    """
+    Retries shared by every @retry function of one crawl cycle, so retries
+    nested inside retried functions can't multiply: once the budget is spent or
+    the cycle deadline has passed, the next failure is raised instead of retried.
+
+    A budget only applies to code run inside use_retry_budget(); anything else
+    (the uploader, the retry of a whole cycle) is never refused.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._remaining: int | None = None
+        self._deadline: float | None = None
+
+    def reset(self, retries: int | None = None, deadline: float | None = None) -> None:
+        """
+        :param retries: Retries allowed until the next reset, None for no limit.
+        :param deadline: Seconds from now after which nothing is retried, None for no deadline.
+        """
+        with self._lock:
+            self._remaining = retries
+            self._deadline = time.monotonic() + deadline if deadline is not None else None
+
+    def time_left(self) -> float | None:
+        if self._deadline is None:
+            return None
+        return self._deadline - time.monotonic()
+
+    def acquire(self, delay: float) -> str | None:
+        """
+        Take one retry from the budget.
+
+        :param delay: The sleep before the retry; a retry that would wake up after the deadline is refused.
+        :return: None when the retry may go ahead, otherwise why it was refused ("budget" or "deadline").
+        """
+        with self._lock:
+            time_left = self.time_left()
+            if time_left is not None and time_left <= delay:
+                return "deadline"
+            if self._remaining is not None:
+                if self._remaining <= 0:
+                    return "budget"
+                self._remaining -= 1
+        return None
+
+
+_current_budget: ContextVar[RetryBudget | None] = ContextVar("retry_budget", default=None)
+
+
+def start_retry_cycle() -> RetryBudget:
+    """
+    A budget for one crawl cycle from RETRY_BUDGET (retries per cycle) and
+    RETRY_DEADLINE (seconds per cycle); unset means no limit.
+    """
+    try:
+        retries = int(os.getenv("RETRY_BUDGET"))
+    except Exception:
+        retries = None
+    try:
+        deadline = float(os.getenv("RETRY_DEADLINE"))
+    except Exception:
+        deadline = None
+    budget = RetryBudget()
+    budget.reset(retries, deadline)
+    return budget
+
+
+def current_retry_budget() -> RetryBudget | None:
+    return _current_budget.get()
+
+
+@contextmanager
+def use_retry_budget(budget: RetryBudget | None):
+    """Take the retries of @retry functions called in this block (and its coroutines) from ``budget``."""
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def bind_retry_budget(func):
+    """Wrap ``func`` to run under the caller's budget, for work handed to another thread."""
+    budget = _current_budget.get()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_retry_budget(budget):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _make_policy(retries, delay, exception, backoff, max_delay, jitter) -> RetryPolicy:
+    return RetryPolicy(
+        retries=retries,
+        delay=delay,
+        backoff=backoff,
+        max_delay=max_delay,
+        jitter=jitter,
+        exceptions=exception if isinstance(exception, tuple) else (exception,),
+    )
+
+
+def _next_delay(policy: RetryPolicy, attempt: int, function_name: str) -> float | None:
+    """
+    Count a failed attempt.
+
+    :return: Seconds to sleep before the next attempt, or None when the error must be raised.
+    """
+    if attempt >= policy.retries:
+        metrics.inc("retry_exhausted_total", function=function_name)
+        return None
+    sleep_time = policy.get_delay(attempt)
+    budget = _current_budget.get()
+    refused = budget.acquire(sleep_time) if budget is not None else None
+    if refused is not None:
+        print(f"Not retrying {function_name}: cycle retry {refused} reached")
+        metrics.inc("retry_refused_total", function=function_name, reason=refused)
+        return None
+    metrics.inc("retries_total", function=function_name)
+    metrics.observe("retry_delay_seconds", sleep_time, function=function_name)
+    return sleep_time
+
+
 def retry(
     retries: int = 20,
     delay: float = 0.25,
-    exception: Type[T] = StaleElementReferenceException,
+    exception: Type[T] | tuple[Type[T], ...] = StaleElementReferenceException,
+    backoff: float = 1,
+    max_delay: float | None = None,
+    jitter: float = 0,
+    policy: RetryPolicy | None = None,
 ):
     """
     A decorator that retries a function call if a specified exception occurs.
+    Every retry also takes one from the current cycle's retry budget, if any.
 
     :param retries: Number of retry attempts before giving up.
-    :param delay: Delay in seconds between retries.
-    :param exception: Exception type to catch and retry on.
+    :param delay: Delay in seconds between retries (before the first retry when backing off).
+    :param exception: Exception type, or tuple of types, to catch and retry on.
+    :param backoff: Factor the delay grows by after every retry.
+    :param max_delay: Upper bound of a single delay.
+    :param jitter: Fraction of each delay that is randomised.
+    :param policy: A RetryPolicy to use instead of the arguments above.
     """
+    if policy is None:
+        policy = _make_policy(retries, delay, exception, backoff, max_delay, jitter)
 
     def decorator(func):
+        function_name = f"{func.__module__}.{func.__name__}"
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            attempts = retries
-            while attempts > 0:
+            attempt = 0
+            while True:
+                attempt += 1
                 try:
                     return func(*args, **kwargs)
-                except exception as e:
+                except policy.exceptions as e:
+                    print(e)
+                    sleep_time = _next_delay(policy, attempt, function_name)
+                    if sleep_time is None:
+                        raise
+                    time.sleep(sleep_time)
+
+        return wrapper
+
+    return decorator
+
+
+def async_retry(
+    retries: int = 20,
+    delay: float = 0.25,
+    exception: Type[T] | tuple[Type[T], ...] = StaleElementReferenceException,
+    backoff: float = 1,
+    max_delay: float | None = None,
+    jitter: float = 0,
+    policy: RetryPolicy | None = None,
+):
+    """retry() for coroutine functions: sleeps with asyncio.sleep between attempts."""
+    if policy is None:
+        policy = _make_policy(retries, delay, exception, backoff, max_delay, jitter)
+
+    def decorator(func):
+        function_name = f"{func.__module__}.{func.__name__}"
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    return await func(*args, **kwargs)
+                except policy.exceptions as e:
                     print(e)
-                    attempts -= 1
-                    if attempts == 0:
+                    sleep_time = _next_delay(policy, attempt, function_name)
+                    if sleep_time is None:
                         raise
-                    time.sleep(delay)
+                    await asyncio.sleep(sleep_time)
 
         return wrapper
 
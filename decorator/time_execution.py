@@ -1,18 +1,17 @@
-import time
 from functools import wraps
 
+from utils import metrics
+
+
 def time_execution(func):
     """
-    A decorator that calculates and logs the execution time of a function.
+    A decorator that records the execution time of a function as a metrics span
+    named after the function.
 
     :param func: The function whose execution time will be measured.
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()  # Record the start time
-        result = func(*args, **kwargs)  # Call the original function
-        end_time = time.time()  # Record the end time
-        execution_time = end_time - start_time
-        print(f"Function '{func.__name__}' executed in {execution_time:.4f} seconds.")
-        return result
+        with metrics.span(func.__name__):
+            return func(*args, **kwargs)
     return wrapper
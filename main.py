@@ -2,36 +2,47 @@ import codecs
 import json
 import os
 import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
+from functools import partial
 
 from dotenv import load_dotenv
-from gspread.utils import a1_to_rowcol
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
 
 import constants
 from QueryCurrency import CurrencyQueryItem
 from QueryItem import ItemQueryItem
-from app.login import login
+from app.pipeline import Pipeline, Stage, get_stage_workers
+from app.upload_queue import get_upload_mode, get_upload_queue
+from app.uploader import get_uploader
 from app.process import calculate_price_change, get_row_run_index
-from decorator.retry import retry
+from decorator.retry import retry, start_retry_cycle, use_retry_budget
 from decorator.time_execution import time_execution
 from model.crawl_model import OfferItem
 from model.enums import StockType
 from model.payload import Row, PriceInfo
 from model.sheet_model import ExtraInfor
+from utils.bij_host_index import BijHostIndex, load_bij_host_index
+from utils.change_detection import RowState, get_change_tracker, row_input_fingerprint, row_result_fingerprint
 from utils.excel_util import CurrencyTemplate, currency_templates_to_dicts, item_templates_to_dicts, ItemTemplate, \
-    create_file_from_template, clear_output_directory
+    create_file_from_template
 from utils.exceptions import PACrawlerError
 from utils.ggsheet import GSheet, Sheet
+from utils.google_api import invalidate_blacklists
 from utils.logger import setup_logging
+from utils import metrics
+from utils.output_generations import get_output_generations
 from utils.pa_extract import extract_offer_items
-from utils.selenium_util import SeleniumUtil
+from utils.price_history import get_price_history, row_observations
+from utils.page_cache import clear_page_cache
+from utils.reference_resolver import resolve_reference_cells
+from utils.sheet_operator import WorksheetWriteBuffer
+from utils.selenium_util import SeleniumPool, SeleniumPools
 
 ### SETUP ###
 load_dotenv("settings.env")
 
 setup_logging()
-gs = GSheet()
 
 
 ### FUNCTIONS ###
@@ -56,15 +67,22 @@ def read_file_with_encoding(file_path, encoding='utf-8'):
 #         return 1
 
 @time_execution
-@retry(5, delay=15, exception=PACrawlerError)
+@retry(5, delay=15, exception=PACrawlerError, backoff=2, max_delay=120, jitter=0.5)
 def process(
-        BIJ_HOST_DATA: dict,
+        BIJ_HOST_DATA: BijHostIndex,
         gsheet: GSheet,
-        browser_list: List[SeleniumUtil]
+        browser_pools: SeleniumPools
 ):
     print("process")
-    browser = browser_list[0]
-    normal_browser = browser_list[1]
+    invalidate_blacklists()
+    clear_page_cache()
+    price_history = get_price_history()
+    if price_history is not None:
+        price_history.start_cycle()
+    change_tracker = get_change_tracker()
+    if change_tracker is not None:
+        change_tracker.start_cycle()
+        print(f"Incremental cycle {change_tracker.cycle}, full refresh: {change_tracker.full_refresh}")
     try:
         sheet = Sheet.from_sheet_id(
             gsheet=gsheet,
@@ -78,178 +96,316 @@ def process(
     except Exception as e:
         print(f"Error getting worksheet: {e}")
         return
-    row_indexes = get_row_run_index(worksheet=worksheet)
+    with metrics.span("sheet_read"):
+        row_indexes = get_row_run_index(worksheet=worksheet)
+        try:
+            row_snapshot = Row.load_snapshot(worksheet, row_indexes)
+        except Exception as e:
+            print(f"Error loading sheet snapshot, fall back to per-row read: {e}")
+            row_snapshot = {}
+
+        rows: dict[int, Row | Exception] = {}
+        for index in row_indexes:
+            try:
+                rows[index] = Row.from_snapshot(worksheet, index, row_snapshot)
+            except Exception as e:
+                rows[index] = e
+    with metrics.span("reference_prefetch"):
+        resolve_reference_cells([row for row in rows.values() if isinstance(row, Row)])
 
     currency_template = []
     item_template = []
 
-    for index in row_indexes:
-        print(f"Row: {index}")
+    log_buffer = WorksheetWriteBuffer(worksheet, flush_interval=get_log_flush_interval())
+    row_results: dict[int, RowTask] = {}
+
+    def _fetch(task: RowTask) -> RowTask | None:
+        return fetch_row_offers(task, browser_pools)
+
+    def _price(task: RowTask) -> RowTask | None:
+        return price_row(task, gsheet, BIJ_HOST_DATA, browser_pools)
+
+    def _write(task: RowTask) -> None:
+        write_row_log(task, log_buffer)
+        row_results[task.index] = task
+
+    pipeline = Pipeline(
+        [
+            Stage("pa_fetch", _fetch, workers=get_stage_workers("PIPELINE_PA_WORKERS")),
+            Stage("price", _price, workers=get_stage_workers("PIPELINE_PRICE_WORKERS")),
+            Stage("write_log", _write, workers=1),
+        ],
+        queue_size=get_stage_workers("PIPELINE_QUEUE_SIZE", default=4),
+    )
+    try:
+        # Only the crawl spends the cycle's retry budget, not the upload or the retry of process itself
+        with use_retry_budget(start_retry_cycle()):
+            pipeline.run(RowTask(index=index, row=rows[index]) for index in row_indexes)
+    finally:
         try:
-            row = Row.from_row_index(worksheet, index)
-            pa_blacklist = row.stock_info.get_pa_blacklist()
+            log_buffer.flush()
         except Exception as e:
-            print(f"Error getting row: {e}")
-            _current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-            write_to_log_cell(worksheet, index, "Error: " + _current_time, log_type="time")
-            continue
-        if not isinstance(row, Row):
-            continue
-        offer_items = extract_offer_items(row.product.PRODUCT_COMPARE, normal_browser)
-        sorted_offer_items = sorted(offer_items, key=lambda x: x.price)
-        item_info, stock_fake_items = None, None
-        if True:
+            print(f"Error writing log cells: {e}")
+        if price_history is not None:
             try:
-                [item_info, stock_fake_items] = calculate_price_change(
-                    gsheet, row, offer_items, BIJ_HOST_DATA, browser, pa_blacklist
-                )
-                if item_info is None:
-                    print("No item info")
-                    continue
+                price_history.flush()
             except Exception as e:
-                print(f"Error calculating price change: {e}")
-                continue
-            row.extra = correct_extra_data(row.extra)
-            final_stock = row.stock_info.cal_stock()
-            if "SPECIAL" in row.product.Product_link:
-                _id_list = row.extra.get_game_list()
-                for _id in _id_list:
-                    _data_info = create_data_from_str(_id)
-                    if _data_info is None:
-                        print(f"Error creating data from string: {_id}")
-                        continue
-                    elif isinstance(_data_info, CurrencyQueryItem):
-                        _currency_info = _data_info
-                        currency_template.append(
-                            CurrencyTemplate(
-                                game=_currency_info.Game,
-                                server=_currency_info.Server,
-                                faction=_currency_info.Faction,
-                                currency_per_unit=row.extra.CURRENCY_PER_UNIT,
-                                total_units=min(final_stock, 10000),
-                                minimum_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
-                                price_per_unit=float(
-                                    f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.3f}"),
-                                ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
-                                discount=row.extra.DISCOUNT,
-                                title=row.product.TITLE,
-                                duration=row.product.DURATION,
-                                delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
-                                description=row.product.DESCRIPTION,
-                            )
-                        )
-                    else:
-                        _item_info = _data_info
-                        item_template.append(
-                            ItemTemplate(
-                                game=_item_info.game,
-                                server=_item_info.server,
-                                faction=_item_info.faction,
-                                item_category1=_item_info.item_category1,
-                                item_category2=_item_info.item_category2,
-                                item_category3=_item_info.item_category3,
-                                item_per_unit=row.extra.CURRENCY_PER_UNIT,
-                                unit_price=float(
-                                    f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.2f}"),
-                                min_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
-                                ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
-                                discount=row.extra.DISCOUNT,
-                                offer_duration=row.product.DURATION,
-                                delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
-                                delivery_info='',
-                                cover_image='',
-                                title=row.product.TITLE,
-                                description=row.product.DESCRIPTION,
-                            )
-                        )
-            else:
-                _data_info = create_data_from_str(row.product.Product_link)
-                if _data_info is None:
-                    print(f"Error creating data from string: {row.product.Product_link}")
-                    continue
-                if isinstance(_data_info, CurrencyQueryItem):
-                    _currency_info = _data_info
-                    currency_template.append(
-                        CurrencyTemplate(
-                            game=_currency_info.Game,
-                            server=_currency_info.Server,
-                            faction=_currency_info.Faction,
-                            currency_per_unit=row.extra.CURRENCY_PER_UNIT,
-                            total_units=min(final_stock, 9999),
-                            minimum_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
-                            price_per_unit=float(f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.3f}"),
-                            ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
-                            discount=row.extra.DISCOUNT,
-                            title=row.product.TITLE,
-                            duration=row.product.DURATION,
-                            delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
-                            description=row.product.DESCRIPTION,
-                        )
-                    )
-                else:
-                    _item_info = _data_info
-                    item_template.append(
-                        ItemTemplate(
-                            game=_item_info.game,
-                            server=_item_info.server,
-                            faction=_item_info.faction,
-                            item_category1=_item_info.item_category1,
-                            item_category2=_item_info.item_category2,
-                            item_category3=_item_info.item_category3,
-                            item_per_unit=row.extra.CURRENCY_PER_UNIT,
-                            unit_price=float(f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.2f}"),
-                            total_units=min(final_stock, 9999),
-                            min_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
-                            ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
-                            discount=row.extra.DISCOUNT,
-                            offer_duration=row.product.DURATION,
-                            delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
-                            delivery_info='',
-                            cover_image='',
-                            title=row.product.TITLE,
-                            description=row.product.DESCRIPTION,
-                        )
-                    )
-            print(f"Price change:\n{item_info.model_dump(mode='json')}")
-            log_str = ""
-            for offer_item in offer_items:
-                if not offer_item.seller.canGetFeedback:
-                    log_str += f"Can't get feedback from {offer_item.seller.name}\n"
-            log_str += get_update_str(sorted_offer_items[0], item_info, stock_fake_items, row.product.DONGIA_LAMTRON)
-            log_str += get_top_pa_offers_str(sorted_offer_items, sorted_offer_items[0], row.product.DONGIA_LAMTRON)
-            write_to_log_cell(worksheet, index, log_str)
-            _current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-            write_to_log_cell(worksheet, index, _current_time, log_type="time")
-        # else:
-        #     print("No valid offer item")
-        #     _current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S") + "\nNo valid offer item\n"
-        #     write_to_log_cell(worksheet, index, _current_time, log_type="time")
-        try:
-            __time_sleep = float(os.getenv("TIME_SLEEP_ROW"))
-        except Exception:
-            print("No time sleep each row (add TIME_SLEEP_ROW to settings file), set default to ")
-            __time_sleep = 0
-        print(f"Sleeping for {__time_sleep} seconds")
-        time.sleep(__time_sleep)
-        print("Next row...")
+                print(f"Error writing price history: {e}")
+    for index in sorted(row_results):
+        currency_template.extend(row_results[index].currency_templates)
+        item_template.extend(row_results[index].item_templates)
+    if change_tracker is not None and not change_tracker.full_refresh and not currency_template and not item_template:
+        print("No row changed since the last upload, skip upload")
+        change_tracker.commit()
+        return
     currency_template = currency_templates_to_dicts(currency_template)
     is_have_item = False
     if len(item_template) > 0:
         is_have_item = True
         item_template = item_templates_to_dicts(item_template)
-    clear_output_directory("storage/output/item")
-    clear_output_directory("storage/output/currency")
-    create_file_from_template("currency_template.xlsx", "storage/output/currency/new_currency_file.xlsx",
-                              currency_template)
-    create_file_from_template("item_template.xlsx", "storage/output/item/new_item_file.xlsx",
-                              item_template)
-    print("Create file successfully, check storage/output folder")
+    with metrics.span("template_write"):
+        output_generations = get_output_generations()
+        staging = output_generations.stage()
+        create_file_from_template("currency_template.xlsx", os.path.join(staging, "currency", "new_currency_file.xlsx"),
+                                  currency_template)
+        create_file_from_template("item_template.xlsx", os.path.join(staging, "item", "new_item_file.xlsx"),
+                                  item_template)
+        generation = output_generations.publish(staging)
+    print(f"Create file successfully, check {generation} folder")
 
+    if get_upload_mode() == "background":
+        on_uploaded = None
+        if change_tracker is not None:
+            states = change_tracker.pending_states()
+            on_uploaded = partial(change_tracker.commit, states)
+        try:
+            get_upload_queue().submit(is_have_item, on_uploaded)
+        except Exception as _e:
+            # The crawl went fine; the rows stay uncommitted and are uploaded again next cycle
+            print(f"Error queueing upload: {_e}")
+            metrics.inc("upload_queue_errors_total")
+        return
     try:
-        normal_browser = SeleniumUtil(mode=1)
-        upload_data_to_site(normal_browser, is_have_item)
+        with metrics.span("upload"):
+            get_uploader().upload(is_have_item)
     except Exception as _e:
         raise PACrawlerError(f"Error uploading data to site: {_e}")
+    if change_tracker is not None:
+        change_tracker.commit()
+
+
+@dataclass
+class RowTask:
+    index: int
+    row: Row | Exception
+    pa_blacklist: frozenset[str] = frozenset()
+    offer_items: list[OfferItem] = field(default_factory=list)
+    currency_templates: list[CurrencyTemplate] = field(default_factory=list)
+    item_templates: list[ItemTemplate] = field(default_factory=list)
+    log_cells: list[tuple[str, str]] = field(default_factory=list)
+
+
+def fetch_row_offers(task: RowTask, browser_pools: SeleniumPools) -> RowTask | None:
+    print(f"Row: {task.index}")
+    try:
+        if isinstance(task.row, Exception):
+            raise task.row
+        task.pa_blacklist = task.row.stock_info.get_pa_blacklist()
+    except Exception as e:
+        print(f"Error getting row: {e}")
+        metrics.inc("row_failures_total", stage="row_load")
+        _current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        task.log_cells.append(("time", "Error: " + _current_time))
+        return task
+    with metrics.span("pa_fetch", details={"row": task.index}):
+        task.offer_items = extract_offer_items(task.row.product.PRODUCT_COMPARE, browser_pools)
+    return task
+
+
+def price_row(
+        task: RowTask,
+        gsheet: GSheet,
+        BIJ_HOST_DATA: BijHostIndex,
+        browser_pools: SeleniumPools,
+) -> RowTask | None:
+    if not isinstance(task.row, Row):
+        # Rows that failed to load only carry their error log to the write stage
+        return task
+    row = task.row
+    offer_items = task.offer_items
+    sorted_offer_items = sorted(offer_items, key=lambda x: x.price)
+    change_tracker = get_change_tracker()
+    input_fingerprint = None
+    if change_tracker is not None:
+        input_fingerprint = row_input_fingerprint(row, offer_items, task.pa_blacklist)
+        if input_fingerprint is None:
+            # A reference read failed: price the row, and compare it again once it was uploaded
+            metrics.inc("rows_unfingerprinted_total")
+        elif change_tracker.inputs_unchanged(row, input_fingerprint):
+            print(f"Row {task.index} unchanged since the last upload, skip")
+            metrics.inc("rows_unchanged_total", stage="inputs")
+            return None
+    try:
+        with metrics.span("price", details={"row": task.index}):
+            [item_info, stock_fake_items] = calculate_price_change(
+                gsheet, row, offer_items, BIJ_HOST_DATA, browser_pools, task.pa_blacklist
+            )
+        if item_info is None:
+            print("No item info")
+            return None
+    except Exception as e:
+        print(f"Error calculating price change: {e}")
+        metrics.inc("row_failures_total", stage="price")
+        return None
+    price_history = get_price_history()
+    if price_history is not None:
+        try:
+            price_history.record(row_observations(row, offer_items, item_info, stock_fake_items))
+        except Exception as e:
+            print(f"Error recording price history: {e}")
+    row_state = None
+    if change_tracker is not None and input_fingerprint is not None:
+        row_state = RowState(
+            input_fingerprint,
+            row_result_fingerprint(input_fingerprint, item_info.stock_type, stock_fake_items),
+            item_info.stock_type,
+        )
+        if change_tracker.result_unchanged(row, row_state):
+            print(f"Row {task.index} priced from the same offers as the last upload, skip")
+            metrics.inc("rows_unchanged_total", stage="result")
+            return None
+    templates = build_row_templates(row, item_info)
+    if templates is None:
+        return None
+    if change_tracker is not None:
+        change_tracker.update(row, row_state)
+    task.currency_templates, task.item_templates = templates
+    print(f"Price change:\n{item_info.model_dump(mode='json')}")
+    log_str = ""
+    for offer_item in offer_items:
+        if not offer_item.seller.canGetFeedback:
+            log_str += f"Can't get feedback from {offer_item.seller.name}\n"
+    log_str += get_update_str(sorted_offer_items[0], item_info, stock_fake_items, row.product.DONGIA_LAMTRON)
+    log_str += get_top_pa_offers_str(sorted_offer_items, sorted_offer_items[0], row.product.DONGIA_LAMTRON)
+    task.log_cells.append(("log", log_str))
+    _current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    task.log_cells.append(("time", _current_time))
+    return task
+
+
+def write_row_log(task: RowTask, log_buffer: WorksheetWriteBuffer) -> None:
+    for log_type, log_str in task.log_cells:
+        write_to_log_cell(log_buffer, task.index, log_str, log_type=log_type)
+
+
+def build_row_templates(
+        row: Row,
+        item_info: PriceInfo,
+) -> tuple[list[CurrencyTemplate], list[ItemTemplate]] | None:
+    currency_templates: list[CurrencyTemplate] = []
+    item_templates: list[ItemTemplate] = []
+    row.extra = correct_extra_data(row.extra)
+    final_stock = row.stock_info.cal_stock()
+    if "SPECIAL" in row.product.Product_link:
+        _id_list = row.extra.get_game_list()
+        for _id in _id_list:
+            _data_info = create_data_from_str(_id)
+            if _data_info is None:
+                print(f"Error creating data from string: {_id}")
+                continue
+            elif isinstance(_data_info, CurrencyQueryItem):
+                _currency_info = _data_info
+                currency_templates.append(
+                    CurrencyTemplate(
+                        game=_currency_info.Game,
+                        server=_currency_info.Server,
+                        faction=_currency_info.Faction,
+                        currency_per_unit=row.extra.CURRENCY_PER_UNIT,
+                        total_units=min(final_stock, 10000),
+                        minimum_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
+                        price_per_unit=float(
+                            f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.3f}"),
+                        ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
+                        discount=row.extra.DISCOUNT,
+                        title=row.product.TITLE,
+                        duration=row.product.DURATION,
+                        delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
+                        description=row.product.DESCRIPTION,
+                    )
+                )
+            else:
+                _item_info = _data_info
+                item_templates.append(
+                    ItemTemplate(
+                        game=_item_info.game,
+                        server=_item_info.server,
+                        faction=_item_info.faction,
+                        item_category1=_item_info.item_category1,
+                        item_category2=_item_info.item_category2,
+                        item_category3=_item_info.item_category3,
+                        item_per_unit=row.extra.CURRENCY_PER_UNIT,
+                        unit_price=float(
+                            f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.2f}"),
+                        min_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
+                        ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
+                        discount=row.extra.DISCOUNT,
+                        offer_duration=row.product.DURATION,
+                        delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
+                        delivery_info='',
+                        cover_image='',
+                        title=row.product.TITLE,
+                        description=row.product.DESCRIPTION,
+                    )
+                )
+    else:
+        _data_info = create_data_from_str(row.product.Product_link)
+        if _data_info is None:
+            print(f"Error creating data from string: {row.product.Product_link}")
+            return None
+        if isinstance(_data_info, CurrencyQueryItem):
+            _currency_info = _data_info
+            currency_templates.append(
+                CurrencyTemplate(
+                    game=_currency_info.Game,
+                    server=_currency_info.Server,
+                    faction=_currency_info.Faction,
+                    currency_per_unit=row.extra.CURRENCY_PER_UNIT,
+                    total_units=min(final_stock, 9999),
+                    minimum_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
+                    price_per_unit=float(f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.3f}"),
+                    ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
+                    discount=row.extra.DISCOUNT,
+                    title=row.product.TITLE,
+                    duration=row.product.DURATION,
+                    delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
+                    description=row.product.DESCRIPTION,
+                )
+            )
+        else:
+            _item_info = _data_info
+            item_templates.append(
+                ItemTemplate(
+                    game=_item_info.game,
+                    server=_item_info.server,
+                    faction=_item_info.faction,
+                    item_category1=_item_info.item_category1,
+                    item_category2=_item_info.item_category2,
+                    item_category3=_item_info.item_category3,
+                    item_per_unit=row.extra.CURRENCY_PER_UNIT,
+                    unit_price=float(f"{item_info.adjusted_price * float(row.extra.CURRENCY_PER_UNIT):.2f}"),
+                    total_units=min(final_stock, 9999),
+                    min_unit_per_order=row.extra.MIN_UNIT_PER_ORDER,
+                    ValueForDiscount=row.extra.VALUE_FOR_DISCOUNT,
+                    discount=row.extra.DISCOUNT,
+                    offer_duration=row.product.DURATION,
+                    delivery_guarantee=row.extra.DELIVERY_GUARANTEE,
+                    delivery_info='',
+                    cover_image='',
+                    title=row.product.TITLE,
+                    description=row.product.DESCRIPTION,
+                )
+            )
+    return currency_templates, item_templates
 
 
 def correct_extra_data(extra: ExtraInfor) -> ExtraInfor:
@@ -284,8 +440,19 @@ def create_data_from_str(s: str) -> CurrencyQueryItem | ItemQueryItem | None:
     return None
 
 
-def upload_data_to_site(browser: SeleniumUtil, isHaveItem: bool):
-    login(browser, isHaveItem)
+def create_browser_pools() -> SeleniumPools:
+    max_pages = get_stage_workers("BROWSER_MAX_PAGES", default=200)
+    return SeleniumPools(
+        {
+            "playerauctions.com": SeleniumPool(
+                mode=1, size=get_stage_workers("PA_BROWSER_POOL_SIZE"), max_pages=max_pages, minimize=True
+            ),
+            "bijiaqi.com": SeleniumPool(
+                mode=2, size=get_stage_workers("BIJ_BROWSER_POOL_SIZE"), max_pages=max_pages
+            ),
+        },
+        default="playerauctions.com",
+    )
 
 
 ### LOG FUNC ###
@@ -366,12 +533,23 @@ def get_update_str(offer_item: OfferItem, item_info: PriceInfo, stock_fake_items
     return _str + "\n"
 
 
+def get_log_flush_interval() -> float:
+    try:
+        return float(os.getenv("LOG_FLUSH_INTERVAL"))
+    except Exception:
+        return 0
+
+
 def write_to_log_cell(
         worksheet,
         row_index,
         log_str,
         log_type="log"
 ):
+    """
+    Write a log/time/error cell. ``worksheet`` may be a WorksheetWriteBuffer,
+    in which case the update is queued and sent with the next batch flush.
+    """
     try:
         r, c = None, None
         if log_type == "log":
@@ -380,7 +558,10 @@ def write_to_log_cell(
             r, c = a1_to_rowcol(f"E{row_index}")
         if log_type == "error":
             r, c = a1_to_rowcol(f"CK{row_index}")
-        worksheet.update_cell(r, c, log_str)
+        if isinstance(worksheet, WorksheetWriteBuffer):
+            worksheet.add(rowcol_to_a1(r, c), log_str)
+        else:
+            worksheet.update_cell(r, c, log_str)
     except Exception as e:
         print(f"Error writing to log cell: {e}")
 
@@ -389,15 +570,13 @@ def write_to_log_cell(
 
 if __name__ == "__main__":
     print("Starting...")
-    BIJ_HOST_DATA = read_file_with_encoding(constants.DATA_PATH, encoding='utf-8')
+    BIJ_HOST_DATA = load_bij_host_index()
     gsheet = GSheet(constants.KEY_PATH)
-    headless_browser = SeleniumUtil(mode=2)
-    normal_browser = SeleniumUtil(mode=1)
-    normal_browser.driver.minimize_window()
-    browser_list = [headless_browser, normal_browser]
+    browser_pools = create_browser_pools()
+    metrics.start_metrics_server()
     while True:
         try:
-            process(BIJ_HOST_DATA, gsheet, browser_list)
+            process(BIJ_HOST_DATA, gsheet, browser_pools)
             try:
                 _time_sleep = float(os.getenv("TIME_SLEEP"))
             except Exception:
@@ -405,8 +584,6 @@ if __name__ == "__main__":
                 _time_sleep = 2
             print(f"Sleeping for {_time_sleep} seconds")
             time.sleep(_time_sleep)
-            # test_browser = SeleniumUtil(mode=1)
-            # login(test_browser, False)
         except Exception as e:
             _str_error = f"Error: {e}"
             sheet = Sheet.from_sheet_id(
@@ -92,7 +92,7 @@ class G2GOfferItem(BaseModel):
     def is_valid(
         self,
         g2g: G2G,
-        g2g_blacklist: list[str],
+        g2g_blacklist: frozenset[str],
     ) -> bool:
         if self.seller_name in g2g_blacklist:
             return False
@@ -112,7 +112,7 @@ class G2GOfferItem(BaseModel):
     def filter_valid_g2g_offer_item(
         g2g: G2G,
         g2g_offer_items: list["G2GOfferItem"],
-        g2g_blacklist: list[str],
+        g2g_blacklist: frozenset[str],
     ) -> list["G2GOfferItem"]:
         valid_g2g_offer_items = []
         for g2g_offer_item in g2g_offer_items:
@@ -157,7 +157,7 @@ class FUNOfferItem(BaseModel):
     def is_valid(
         self,
         fun: FUN,
-        fun_blacklist: list[str],
+        fun_blacklist: frozenset[str],
     ) -> bool:
         if self.seller in fun_blacklist:
             return False
@@ -171,7 +171,7 @@ class FUNOfferItem(BaseModel):
     def filter_valid_fun_offer_items(
         fun: FUN,
         fun_offer_items: list["FUNOfferItem"],
-        fun_blacklist: list[str],
+        fun_blacklist: frozenset[str],
     ) -> list["FUNOfferItem"]:
         valid_fun_offer_items = []
         for fun_offer_item in fun_offer_items:
@@ -6,10 +6,14 @@ from pydantic import BaseModel, ConfigDict
 
 from model.crawl_model import OfferItem, StockNumInfo
 from model.enums import StockType
-from utils.sheet_operator import query_multi_model_from_worksheet
+from utils.sheet_operator import query_multi_model_from_worksheet, query_multi_model_from_snapshot, load_rows_snapshot
 from .sheet_model import Product, StockInfo, G2G, FUN, BIJ, ExtraInfor, DD, PriceSheet1, PriceSheet2, PriceSheet3, \
     PriceSheet4
 
+ROW_MODELS = [Product, StockInfo, G2G, FUN, BIJ, ExtraInfor, DD, PriceSheet1, PriceSheet2, PriceSheet3, PriceSheet4]
+ROW_FIRST_COL = "B"
+ROW_LAST_COL = "DZ"
+
 
 @dataclass
 class Product_:
@@ -140,7 +144,33 @@ class Row:
                 row_index,
                 worksheet,
                 *query_multi_model_from_worksheet(
-                    worksheet, [Product, StockInfo, G2G, FUN, BIJ, ExtraInfor, DD, PriceSheet1, PriceSheet2, PriceSheet3, PriceSheet4], row_index
+                    worksheet, ROW_MODELS, row_index
+                ),  # type: ignore
+            )
+        except Exception as e:
+            raise Exception(f"Error getting row: {e}")
+
+    @staticmethod
+    def load_snapshot(
+            worksheet,
+            row_indexes: list[int],
+    ) -> dict[int, list]:
+        return load_rows_snapshot(worksheet, row_indexes, ROW_FIRST_COL, ROW_LAST_COL)
+
+    @staticmethod
+    def from_snapshot(
+            worksheet,
+            row_index: int,
+            snapshot: dict[int, list],
+    ) -> "Row":
+        if row_index not in snapshot:
+            return Row.from_row_index(worksheet, row_index)
+        try:
+            return Row(
+                row_index,
+                worksheet,
+                *query_multi_model_from_snapshot(
+                    snapshot[row_index], ROW_MODELS, row_index, ROW_FIRST_COL
                 ),  # type: ignore
             )
         except Exception as e:
@@ -4,12 +4,20 @@ from typing import Annotated, cast
 
 from decorator.time_execution import time_execution
 from utils.ggsheet import GSheet, Sheet
-from utils.google_api import StockManager
+from utils.google_api import StockManager, get_blacklist
+
+
+def is_reference_set(*parts: str | None) -> bool:
+    return all(part not in (None, "") for part in parts)
 
 
 class BaseGSheetModel(BaseModel):
     row_index: int | None = None
 
+    def reference_cells(self) -> list[tuple[str, str]]:
+        """(spreadsheet id, A1 range) pairs this model reads through StockManager."""
+        return []
+
     @classmethod
     def fields_exclude_row_index(
             cls,
@@ -61,6 +69,20 @@ class Product(BaseGSheetModel):
     SHEET_MIN_STOCKFAKE: Annotated[str | None, "CQ"] = ''
     CELL_MIN_STOCKFAKE: Annotated[str | None, "CR"] = ''
 
+    def reference_cells(self) -> list[tuple[str, str]]:
+        references = [
+            (self.IDSHEET_MIN, f"'{self.SHEET_MIN}'!{self.CELL_MIN}", self.SHEET_MIN, self.CELL_MIN),
+            (self.IDSHEET_MAX, f"'{self.SHEET_MAX}'!{self.CELL_MAX}", self.SHEET_MAX, self.CELL_MAX),
+            (self.IDSHEET_MIN2, f"'{self.SHEET_MIN2}'!{self.CELL_MIN2}", self.SHEET_MIN2, self.CELL_MIN2),
+            (self.IDSHEET_MAX2, f"'{self.SHEET_MAX2}'!{self.CELL_MAX2}", self.SHEET_MAX2, self.CELL_MAX2),
+            (self.IDSHEET_MIN_STOCKFAKE, f"'{self.SHEET_MIN_STOCKFAKE}'!{self.CELL_MIN_STOCKFAKE}",
+             self.SHEET_MIN_STOCKFAKE, self.CELL_MIN_STOCKFAKE),
+            (self.IDSHEET_MAX_STOCKFAKE, f"'{self.SHEET_MAX_STOCKFAKE}'!{self.CELL_MAX_STOCKFAKE}",
+             self.SHEET_MAX_STOCKFAKE, self.CELL_MAX_STOCKFAKE),
+        ]
+        return [(sheet_id, range_name) for sheet_id, range_name, sheet, cell in references
+                if is_reference_set(sheet_id, sheet, cell)]
+
     def min_price_stock_1(
             self,
             gsheet: GSheet,
@@ -141,11 +163,23 @@ class StockInfo(BaseGSheetModel):
     _stock1: int | None = 0
     _stock2: int | None = 0
 
-    def get_pa_blacklist(self) -> list[str]:
-        blacklist = []
+    def reference_cells(self) -> list[tuple[str, str]]:
+        references = [
+            (self.IDSHEET_STOCK, f"'{self.SHEET_STOCK}'!{self.CELL_STOCK}", self.SHEET_STOCK, self.CELL_STOCK),
+            (self.IDSHEET_STOCK2, f"'{self.SHEET_STOCK2}'!{self.CELL_STOCK2}", self.SHEET_STOCK2, self.CELL_STOCK2),
+        ]
+        if self.IDSHEET_STOCK == self.IDSHEET_STOCK2:
+            # get_stocks reads the second cell from the first stock sheet
+            references.append(
+                (self.IDSHEET_STOCK, f"'{self.SHEET_STOCK}'!{self.CELL_STOCK2}", self.SHEET_STOCK, self.CELL_STOCK2)
+            )
+        return [(sheet_id, range_name) for sheet_id, range_name, sheet, cell in references
+                if is_reference_set(sheet_id, sheet, cell)]
+
+    def get_pa_blacklist(self) -> frozenset[str]:
+        blacklist = frozenset()
         try:
-            sheet_manager = StockManager(self.PA_IDSHEET_BLACKLIST)
-            blacklist = sheet_manager.get_multiple_str_cells(f"'{self.PA_SHEET_BLACKLIST}'!{self.PA_CELL_BLACKLIST}")
+            blacklist = get_blacklist(self.PA_IDSHEET_BLACKLIST, f"'{self.PA_SHEET_BLACKLIST}'!{self.PA_CELL_BLACKLIST}")
         except Exception as e:
             print("Cant get pa blacklist: ", e)
             pass
@@ -213,9 +247,8 @@ class G2G(BaseGSheetModel):
     def get_blacklist(
             self,
             gsheet: GSheet,
-    ) -> list[str]:
-        sheet_manager = StockManager(self.G2G_IDSHEET_BLACKLIST)
-        blacklist = sheet_manager.get_multiple_str_cells(f"'{self.G2G_SHEET_BLACKLIST}'!{self.G2G_CELL_BLACKLIST}")
+    ) -> frozenset[str]:
+        blacklist = get_blacklist(self.G2G_IDSHEET_BLACKLIST, f"'{self.G2G_SHEET_BLACKLIST}'!{self.G2G_CELL_BLACKLIST}")
         # blacklist = [item for sublist in query_values for item in sublist]
         return blacklist
 
@@ -237,9 +270,8 @@ class FUN(BaseGSheetModel):
     FUN_SHEET_BLACKLIST: Annotated[str | None, "BR"] = ''
     FUN_CELL_BLACKLIST: Annotated[str | None, "BS"] = ''
 
-    def get_blacklist(self, gsheet: GSheet) -> list[str]:
-        sheet_manager = StockManager(self.FUN_IDSHEET_BLACKLIST)
-        blacklist = sheet_manager.get_multiple_str_cells(f"'{self.FUN_SHEET_BLACKLIST}'!{self.FUN_CELL_BLACKLIST}")
+    def get_blacklist(self, gsheet: GSheet) -> frozenset[str]:
+        blacklist = get_blacklist(self.FUN_IDSHEET_BLACKLIST, f"'{self.FUN_SHEET_BLACKLIST}'!{self.FUN_CELL_BLACKLIST}")
         return blacklist
 
 # BT BJ BV BW BX BY BZ CA CB CC CD
@@ -256,9 +288,8 @@ class BIJ(BaseGSheetModel):
     BIJ_SHEET_BLACKLIST: Annotated[str | None, "CC"] = ''
     BIJ_CELL_BLACKLIST: Annotated[str | None, "CD"] = ''
 
-    def get_blacklist(self, gsheet: GSheet) -> list[str]:
-        sheet_manager = StockManager(self.BIJ_IDSHEET_BLACKLIST)
-        blacklist = sheet_manager.get_multiple_str_cells(f"'{self.BIJ_SHEET_BLACKLIST}'!{self.BIJ_CELL_BLACKLIST}")
+    def get_blacklist(self, gsheet: GSheet) -> frozenset[str]:
+        blacklist = get_blacklist(self.BIJ_IDSHEET_BLACKLIST, f"'{self.BIJ_SHEET_BLACKLIST}'!{self.BIJ_CELL_BLACKLIST}")
         return blacklist
 
 #CE CF CG CH CI CJ CK CL
@@ -272,6 +303,11 @@ class ExtraInfor(BaseGSheetModel):
     GAME_LIST_SHEET: Annotated[str | None, "CK"] = ""
     GAME_LIST_CELLS: Annotated[str | None, "CL"] = ""
 
+    def reference_cells(self) -> list[tuple[str, str]]:
+        if not is_reference_set(self.GAME_LIST_SHEET_ID, self.GAME_LIST_SHEET, self.GAME_LIST_CELLS):
+            return []
+        return [(self.GAME_LIST_SHEET_ID, f"'{self.GAME_LIST_SHEET}'!{self.GAME_LIST_CELLS}")]
+
     def get_game_list(self) -> list[str]:
         sheet_manager = StockManager(self.GAME_LIST_SHEET_ID)
         game_list = sheet_manager.get_multiple_str_cells(f"'{self.GAME_LIST_SHEET}'!{self.GAME_LIST_CELLS}")
@@ -297,6 +333,11 @@ class PriceSheet1(BaseGSheetModel):
     SHEET_PRICE: Annotated[str | None, "DD"] = ""
     CELL_PRICE: Annotated[str | None, "DE"] = ""
 
+    def reference_cells(self) -> list[tuple[str, str]]:
+        if not is_reference_set(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE):
+            return []
+        return [(self.ID_SHEET_PRICE, f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
@@ -312,6 +353,11 @@ class PriceSheet2(BaseGSheetModel):
     SHEET_PRICE: Annotated[str | None, "DK"] = ""
     CELL_PRICE: Annotated[str | None, "DL"] = ""
 
+    def reference_cells(self) -> list[tuple[str, str]]:
+        if not is_reference_set(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE):
+            return []
+        return [(self.ID_SHEET_PRICE, f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
@@ -327,6 +373,11 @@ class PriceSheet3(BaseGSheetModel):
     SHEET_PRICE: Annotated[str | None, "DR"] = ""
     CELL_PRICE: Annotated[str | None, "DS"] = ""
 
+    def reference_cells(self) -> list[tuple[str, str]]:
+        if not is_reference_set(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE):
+            return []
+        return [(self.ID_SHEET_PRICE, f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
@@ -342,6 +393,11 @@ class PriceSheet4(BaseGSheetModel):
     SHEET_PRICE: Annotated[str | None, "DY"] = ""
     CELL_PRICE: Annotated[str | None, "DZ"] = ""
 
+    def reference_cells(self) -> list[tuple[str, str]]:
+        if not is_reference_set(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE):
+            return []
+        return [(self.ID_SHEET_PRICE, f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
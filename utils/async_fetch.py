@@ -0,0 +1,177 @@
+import asyncio
+import os
+import threading
+from importlib.util import find_spec
+from typing import Coroutine, TypeVar
+from urllib.parse import urlsplit
+
+from decorator.retry import RetryPolicy, async_retry, current_retry_budget, use_retry_budget
+from model.crawl_model import G2GOfferItem, FUNOfferItem
+from utils import metrics, rate_limiter
+from utils import dd_utils, fun_extract, g2g_extract
+
+R = TypeVar("R")
+
+DEFAULT_HOST_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 15
+
+try:
+    import httpx
+    HTTP_ERRORS: tuple[type[Exception], ...] = (httpx.HTTPError,)
+except ImportError:
+    HTTP_ERRORS = ()
+
+# Same backoff as the sync G2G page fetch
+PAGE_RETRY_POLICY = RetryPolicy(retries=5, delay=1.2, backoff=2, max_delay=10, jitter=0.5, exceptions=HTTP_ERRORS)
+
+# httpx negotiates the encodings it can decode, and Connection is not allowed over HTTP/2
+G2G_HEADERS = {
+    name: value for name, value in g2g_extract.DEFAULT_HEADERS.items()
+    if name not in ("Accept-Encoding", "Connection")
+}
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+_clients: dict[str, "httpx.AsyncClient"] = {}
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def get_competitor_fetch_mode() -> str:
+    """
+    COMPETITOR_FETCH_MODE: async (G2G/FUN/DD373 pages over the shared async client)
+    or sync (requests, one call per page). Falls back to sync when httpx is missing.
+    """
+    mode = os.getenv("COMPETITOR_FETCH_MODE", "async").strip().lower()
+    if mode == "async" and find_spec("httpx") is None:
+        return "sync"
+    return mode
+
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name))
+    except Exception:
+        return default
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """The event loop every fetch runs on, started once in a daemon thread."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-fetch", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+async def _in_budget(budget, coro: Coroutine[None, None, R]) -> R:
+    with use_retry_budget(budget):
+        return await coro
+
+
+def run(coro: Coroutine[None, None, R]) -> R:
+    """
+    Run a coroutine on the fetch loop and wait for its result; callable from any
+    thread. Its retries come out of the caller's retry budget.
+    """
+    return asyncio.run_coroutine_threadsafe(_in_budget(current_retry_budget(), coro), _get_loop()).result()
+
+
+def _get_client(source: str):
+    """
+    One connection-pooled client per site, shared by every fetch of that site
+    (keep-alive, HTTP/2 when the h2 package is installed). Only used from the
+    fetch loop.
+    """
+    client = _clients.get(source)
+    if client is None:
+        timeout = _get_float_env("ASYNC_FETCH_TIMEOUT", DEFAULT_TIMEOUT)
+        client = _clients[source] = httpx.AsyncClient(
+            http2=find_spec("h2") is not None,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            follow_redirects=True,
+        )
+    return client
+
+
+def _reset_cookies(client, cookies: dict[str, str]) -> None:
+    """
+    Put the fixed cookies (region, currency) back into the client's jar, over
+    any Set-Cookie of the same name an earlier response left there.
+    """
+    for cookie in list(client.cookies.jar):
+        if cookie.name in cookies:
+            client.cookies.jar.clear(cookie.domain, cookie.path, cookie.name)
+    client.cookies.update(cookies)
+
+
+def _get_host_semaphore(url: str) -> asyncio.Semaphore:
+    """At most ASYNC_FETCH_HOST_CONCURRENCY requests in flight per host."""
+    host = urlsplit(url).netloc
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        limit = int(_get_float_env("ASYNC_FETCH_HOST_CONCURRENCY", DEFAULT_HOST_CONCURRENCY))
+        semaphore = _host_semaphores[host] = asyncio.Semaphore(max(1, limit))
+    return semaphore
+
+
+@async_retry(policy=PAGE_RETRY_POLICY)
+async def fetch_text(
+        url: str,
+        source: str,
+        headers: dict[str, str] | None = None,
+        cookies: dict[str, str] | None = None,
+) -> str:
+    """
+    GET a page with the shared client, retried with PAGE_RETRY_POLICY (out of the
+    cycle's retry budget) on HTTP errors, connection errors and timeouts.
+
+    :param source: Site the page belongs to: metrics label and the client it is fetched with.
+    :param cookies: Fixed cookies of the site, set again in its client's jar before the request.
+    """
+    async with _get_host_semaphore(url):
+        await rate_limiter.acquire_async(url)
+        with metrics.span("fetch", source=source):
+            client = _get_client(source)
+            if cookies:
+                _reset_cookies(client, cookies)
+            res = await client.get(url, headers=headers)
+            res.raise_for_status()
+            return res.text
+
+
+async def _parse(func, *args):
+    # Parsing is CPU work: keep it off the loop so other fetches go on meanwhile
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def g2g_fetch_offer_items(url: str) -> list[G2GOfferItem]:
+    html = await fetch_text(url, "g2g", headers=G2G_HEADERS, cookies=g2g_extract.DEFAULT_COOKIES)
+    return await _parse(g2g_extract.g2g_extract_offer_items_from_html, html)
+
+
+async def fun_fetch_offer_items(url: str, filters: list[str]) -> list[FUNOfferItem]:
+    html = await fetch_text(url, "fun", cookies=fun_extract.DEFAULT_COOKIES)
+    return await _parse(fun_extract.fun_extract_offer_items_from_html, html, filters)
+
+
+async def dd373_fetch_listings(url: str) -> list[dd_utils.DD373Product]:
+    html = await fetch_text(url, "dd", headers=dd_utils.DEFAULT_HEADERS)
+    return await _parse(dd_utils.parse_dd373_listings, html, dd_utils.dd373_domain(url))
+
+
+def g2g_offer_items(url: str) -> list[G2GOfferItem]:
+    """Blocking form of g2g_fetch_offer_items, same result as g2g_extract_offer_items."""
+    return run(g2g_fetch_offer_items(url))
+
+
+def fun_offer_items(url: str, filters: list[str]) -> list[FUNOfferItem]:
+    """Blocking form of fun_fetch_offer_items, same result as fun_extract_offer_items."""
+    return run(fun_fetch_offer_items(url, filters))
+
+
+def dd373_listings(url: str) -> list[dd_utils.DD373Product]:
+    """Blocking form of dd373_fetch_listings, same result as get_dd373_listings."""
+    return run(dd373_fetch_listings(url))
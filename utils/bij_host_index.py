@@ -0,0 +1,83 @@
+import codecs
+import json
+import os
+import sqlite3
+
+import constants
+
+
+class BijHostIndex:
+    """hostid -> hostname of the BIJ servers in storage/output.json."""
+
+    def __init__(self, hostnames: dict[str, str]) -> None:
+        self.hostnames = hostnames
+
+    def get_hostname(self, hostid) -> str | None:
+        return self.hostnames.get(str(hostid))
+
+    def __len__(self) -> int:
+        return len(self.hostnames)
+
+    @classmethod
+    def from_entries(cls, entries: list[dict]) -> "BijHostIndex":
+        hostnames: dict[str, str] = {}
+        for entry in entries:
+            # The first entry of a hostid wins, like the linear scan did
+            hostnames.setdefault(str(entry['hostid']), entry['hostname'])
+        return cls(hostnames)
+
+
+def _source_stamp(json_path: str) -> str:
+    stat = os.stat(json_path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _read_index(index_path: str, stamp: str) -> BijHostIndex | None:
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with sqlite3.connect(index_path) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+            if row is None or row[0] != stamp:
+                return None
+            return BijHostIndex(dict(conn.execute("SELECT hostid, hostname FROM hosts")))
+    except sqlite3.Error as e:
+        print(f"Can't read BIJ host index {index_path}: {e}")
+        return None
+
+
+def _write_index(index_path: str, stamp: str, index: BijHostIndex) -> None:
+    tmp_path = f"{index_path}.tmp"
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            with conn:
+                conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                conn.execute("CREATE TABLE hosts (hostid TEXT PRIMARY KEY, hostname TEXT NOT NULL) WITHOUT ROWID")
+                conn.execute("INSERT INTO meta VALUES ('source', ?)", (stamp,))
+                conn.executemany("INSERT INTO hosts VALUES (?, ?)", index.hostnames.items())
+        finally:
+            conn.close()
+        os.replace(tmp_path, index_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Can't write BIJ host index {index_path}: {e}")
+
+
+def load_bij_host_index(
+        json_path: str = constants.DATA_PATH,
+        index_path: str = constants.BIJ_HOST_INDEX_PATH,
+) -> BijHostIndex:
+    """
+    Load the hostid index from its SQLite copy next to the JSON, and only parse
+    the JSON (and rewrite the copy) when the JSON changed since the copy was made.
+    """
+    stamp = _source_stamp(json_path)
+    index = _read_index(index_path, stamp)
+    if index is not None:
+        return index
+    with codecs.open(json_path, 'r', encoding='utf-8') as file:
+        index = BijHostIndex.from_entries(json.load(file))
+    _write_index(index_path, stamp, index)
+    return index
@@ -1,92 +1,29 @@
-import codecs
-import json
-import logging
-import os
-import platform
+import re
 import time
-import zipfile
-from datetime import datetime
-
-import gspread
-import wget
-from dotenv import load_dotenv
-from oauth2client.service_account import ServiceAccountCredentials
-from selenium import webdriver
+from urllib.parse import urljoin
+
+from bs4 import Tag
 from selenium.common.exceptions import StaleElementReferenceException
-from selenium.common.exceptions import WebDriverException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
 
 import constants
+from utils import metrics, rate_limiter
+from utils.html_parser import make_soup, class_strainer
 from model.crawl_model import BijOfferItem, extract_integers_from_string
 from model.sheet_model import BIJ
+from utils.bij_host_index import BijHostIndex
 from utils.selenium_util import SeleniumUtil
 
-
-## Retry functions
-
-def get_cell_text(cell, retries=3):
-    for _ in range(retries):
-        try:
-            return cell.text
-        except StaleElementReferenceException:
-            time.sleep(0.25)
-    raise StaleElementReferenceException("Failed to get cell text after retries")
-
-
-def get_row_elements(row, retries=3):
-    while retries > 0:
-        try:
-            return row.find_elements(By.TAG_NAME, 'td')
-        except StaleElementReferenceException:
-            retries -= 1
-            if retries == 0:
-                raise
-            time.sleep(0.25)
-
-
-def find_link_element(cell, retries=3):
-    for _ in range(retries):
-        try:
-            return cell.find_elements(By.TAG_NAME, 'a')[1]
-        except StaleElementReferenceException:
-            time.sleep(0.25)
-    raise StaleElementReferenceException("Failed to find link element after retries")
-
-
-def get_link_attribute(link_element, attribute='href', retries=3):
-    for _ in range(retries):
-        try:
-            return link_element.get_attribute(attribute)
-        except StaleElementReferenceException:
-            time.sleep(0.25)
-    raise StaleElementReferenceException(f"Failed to get attribute '{attribute}' after retries")
-
-
-def get_row_elements_with_retries(row, retries=3):
-    for _ in range(retries):
-        try:
-            return row.find_elements(By.TAG_NAME, 'td')
-        except StaleElementReferenceException:
-            time.sleep(0.25)
-    raise StaleElementReferenceException("Failed to find row elements after retries")
-
-
-def find_elements_with_retries(parent_element, by, value, retries=3):
-    for _ in range(retries):
-        try:
-            return parent_element.find_elements(by, value)
-        except StaleElementReferenceException:
-            time.sleep(0.25)
-    raise StaleElementReferenceException(f"Failed to find elements by {by}='{value}' after retries")
+TABLE_STRAINER = class_strainer("bijia")
+WHITESPACE_PATTERN = re.compile(r"[ \t\r\n\f]+")
 
 
 def get_hostname_by_host_id(data, hostid):
+    if isinstance(data, BijHostIndex):
+        return data.get_hostname(hostid)
     for entry in data:
         if entry['hostid'] == str(hostid):
             return entry['hostname']
@@ -97,12 +34,13 @@ def bij_lowest_price(
         BIJ_HOST_DATA: dict,
         selenium: SeleniumUtil,
         data: BIJ,
-        black_list) -> BijOfferItem:
+        black_list: frozenset[str]) -> BijOfferItem:
     # print("herer")
     retries_time = constants.RETRIES_TIME
     data.BIJ_NAME = get_hostname_by_host_id(BIJ_HOST_DATA, data.BIJ_NAME)
     data.BIJ_NAME = str(data.BIJ_NAME) + " "
-    selenium.get("https://www.bijiaqi.com/")
+    rate_limiter.acquire(constants.DEFAULT_URL)
+    selenium.get(constants.DEFAULT_URL)
     try:
         wait = WebDriverWait(selenium.driver, constants.TIMEOUT)
         input_field = wait.until(EC.element_to_be_clickable((By.ID, 'speedhostname')))
@@ -110,12 +48,15 @@ def bij_lowest_price(
         input_field.send_keys(Keys.BACKSPACE)
         input_field.send_keys(Keys.ENTER)
         time.sleep(1)
-        table = None
+        table_html = None
         while retries_time > 0:
             try:
-                table = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'td table.tb.bijia.limit')))
+                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'td table.tb.bijia.limit')))
                 more_row = selenium.driver.find_element(By.XPATH, "//tr[@class='more']")
                 selenium.driver.execute_script("arguments[0].click();", more_row)
+                # The whole table in one call instead of a round trip per row and cell
+                table = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'td table.tb.bijia.limit')))
+                table_html = table.get_attribute("outerHTML")
                 break
             except StaleElementReferenceException:
                 retries_time -= 1
@@ -123,50 +64,87 @@ def bij_lowest_price(
                     raise
                 time.sleep(0.25)
 
-        data_array = []
+        data_array = read_bij_table(table_html, base_url=selenium.driver.current_url)
+        return select_bij_offer(bij_offer_items_from_table(data_array), data, black_list)
+    except Exception as e:
+        raise RuntimeError(f"Error getting BIJ lowest price: {e}") from e
+
+
+def _visible_text(tag: Tag) -> str:
+    # What WebElement.text returns: whitespace collapsed and trimmed, except
+    # non-breaking spaces, which are kept (as plain spaces)
+    return WHITESPACE_PATTERN.sub(" ", tag.get_text()).strip(" \t\r\n\f").replace("\xa0", " ")
+
 
-        for row in find_elements_with_retries(table, By.TAG_NAME, 'tr', retries=retries_time):
+def read_bij_table(html: str, base_url: str = constants.DEFAULT_URL) -> list[list[str]]:
+    """
+    Cell texts of every row of the BIJ price table, read the way the table used
+    to be walked cell by cell through WebDriver: blank cells are skipped and the
+    "卖给他" cell is replaced by the absolute href of its second link.
+
+    :param html: The table's outerHTML (or a page containing it).
+    :param base_url: The page URL, relative links are resolved against it.
+    """
+    with metrics.span("parse", source="bij"):
+        soup = make_soup(html, TABLE_STRAINER)
+        table = soup.select_one("table.tb.bijia.limit") or soup
+        data_array = []
+        for row in table.find_all("tr"):
             row_data = []
-            for cell in get_row_elements_with_retries(row, retries=retries_time):
-                cell_text = get_cell_text(cell, retries=retries_time)
+            for cell in row.find_all("td"):
+                cell_text = _visible_text(cell)
                 if cell_text == " ":
                     continue
                 elif cell_text == "卖给他":
-                    link_element = find_link_element(cell, retries=retries_time)
-                    row_data.append(get_link_attribute(link_element, attribute='href', retries=retries_time))
+                    href = cell.find_all("a")[1].get("href")
+                    row_data.append(urljoin(base_url, href) if href is not None else None)
                 else:
                     row_data.append(cell_text)
             data_array.append(row_data)
-
-        data_array = data_array[3:-2]
-        results = list()
-        for row in data_array:
-            gold = extract_integers_from_string(row[2])
-            if len(gold) == 2:
-                min_gold = gold[0]
-                max_gold = gold[1]
-            else:
-                min_gold = 0
-                max_gold = 0
-            result = BijOfferItem(
-                username=str(row[0]),
-                money=float(row[1]),
-                gold=gold,
-                min_gold=min_gold,
-                max_gold=max_gold,
-                dept=row[3],
-                time=row[4],
-                link=row[5],
-                type=row[6],
-                filter=row[7]
-            )
-            results.append(result)
-        ans = list()
-        for result in results:
-            if result.type in data.BIJ_DELIVERY_METHOD and result.username not in black_list:
-                if result.min_gold >= data.BIJ_STOCKMIN and result.max_gold <= data.BIJ_STOCKMAX:
-                    ans = result
-                    break
-        return ans
-    except Exception as e:
-        raise RuntimeError(f"Error getting BIJ lowest price: {e}")
+        return data_array
+
+
+def bij_offer_items_from_table(data_array: list[list[str]]) -> list[BijOfferItem]:
+    """
+    Offers of a BIJ price table.
+
+    :param data_array: Cell texts of every table row (the link cell holding its "卖给他" href),
+        including the 3 header rows and 2 footer rows.
+    """
+    results = list()
+    for row in data_array[3:-2]:
+        gold = extract_integers_from_string(row[2])
+        if len(gold) == 2:
+            min_gold = gold[0]
+            max_gold = gold[1]
+        else:
+            min_gold = 0
+            max_gold = 0
+        result = BijOfferItem(
+            username=str(row[0]),
+            money=float(row[1]),
+            gold=gold,
+            min_gold=min_gold,
+            max_gold=max_gold,
+            dept=row[3],
+            time=row[4],
+            link=row[5],
+            type=row[6],
+            filter=row[7]
+        )
+        results.append(result)
+    return results
+
+
+def select_bij_offer(
+        results: list[BijOfferItem],
+        data: BIJ,
+        black_list: frozenset[str]) -> BijOfferItem | list:
+    """First offer in table order matching the delivery method and stock range, [] if none."""
+    ans = list()
+    for result in results:
+        if result.type in data.BIJ_DELIVERY_METHOD and result.username not in black_list:
+            if result.min_gold >= data.BIJ_STOCKMIN and result.max_gold <= data.BIJ_STOCKMAX:
+                ans = result
+                break
+    return ans
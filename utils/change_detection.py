@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+from model.crawl_model import OfferItem
+from model.enums import StockType
+from model.payload import Row
+from utils.google_api import get_prefetched_range
+
+DEFAULT_FULL_REFRESH_EVERY = 10
+
+# Note and Last_Update are the log/time cells we write ourselves
+EXCLUDED_FIELDS = {"row_index", "Note", "Last_Update"}
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def row_input_fingerprint(row: Row, offer_items: list[OfferItem], pa_blacklist: frozenset[str]) -> str | None:
+    """
+    Hash of everything a row is priced from before the competitors are asked:
+    its sheet values, the referenced min/max/stock/price cells and game list,
+    the PA offers and the PA blacklist.
+
+    :return: None when a referenced range was not prefetched, so the row can't be compared.
+    """
+    models = [row.product, row.stock_info, row.g2g, row.fun, row.bij, row.extra, row.dd,
+              row.s1, row.s2, row.s3, row.s4]
+    sheet_values = [model.model_dump(mode="json", exclude=EXCLUDED_FIELDS) for model in models]
+    references = []
+    for model in [row.product, row.stock_info, row.extra, row.s1, row.s2, row.s3, row.s4]:
+        for spreadsheet_id, range_name in model.reference_cells():
+            values = get_prefetched_range(spreadsheet_id, range_name)
+            if values is None:
+                return None
+            references.append((spreadsheet_id, range_name, values))
+    offers = sorted(
+        (
+            offer_item.offer_id,
+            offer_item.seller.name if offer_item.seller else None,
+            offer_item.price,
+            offer_item.quantity,
+            offer_item.min_unit,
+            offer_item.min_stock,
+            str(offer_item.delivery_time),
+        )
+        for offer_item in offer_items
+    )
+    return _digest(sheet_values, references, offers, sorted(pa_blacklist))
+
+
+def row_result_fingerprint(input_fingerprint: str, stock_type: StockType, stock_fake_items: list | None) -> str:
+    """The input fingerprint plus the stock type picked and the competitor minima seen."""
+    return _digest(input_fingerprint, stock_type.name, stock_fake_items)
+
+
+@dataclass
+class RowState:
+    input_fingerprint: str
+    result_fingerprint: str
+    stock_type: StockType
+
+
+class ChangeTracker:
+    """
+    Fingerprints of the rows uploaded so far, to leave rows whose inputs did
+    not move out of the next cycle. Equal inputs keep the price already
+    uploaded, so the random price adjustment is not drawn again for them.
+
+    New fingerprints are only kept once the cycle's upload went through
+    (commit, possibly after the next cycle started); every full_refresh_every-th cycle reprices and uploads every row.
+    """
+
+    def __init__(self, full_refresh_every: int = DEFAULT_FULL_REFRESH_EVERY) -> None:
+        self.full_refresh_every = full_refresh_every
+        self.cycle = 0
+        self.full_refresh = True
+        self._lock = threading.Lock()
+        self._states: dict[tuple[int, str], RowState] = {}
+        # None drops the row's state, for rows uploaded without a fingerprint
+        self._pending: dict[tuple[int, str], RowState | None] = {}
+
+    @staticmethod
+    def _key(row: Row) -> tuple[int, str]:
+        return row.row_index, row.product.Product_link
+
+    def start_cycle(self) -> None:
+        with self._lock:
+            self.cycle += 1
+            self.full_refresh = self.full_refresh_every <= 1 or (self.cycle - 1) % self.full_refresh_every == 0
+            self._pending = {}
+
+    def inputs_unchanged(self, row: Row, input_fingerprint: str) -> bool:
+        """
+        Whether the row can be skipped before pricing: same inputs as the last
+        upload and a stock type that does not depend on competitor prices.
+        """
+        if self.full_refresh:
+            return False
+        with self._lock:
+            state = self._states.get(self._key(row))
+        return (
+                state is not None
+                and state.input_fingerprint == input_fingerprint
+                and state.stock_type is not StockType.stock_fake
+        )
+
+    def result_unchanged(self, row: Row, state: RowState) -> bool:
+        """Whether a priced row saw exactly what it saw at the last upload."""
+        if self.full_refresh:
+            return False
+        with self._lock:
+            previous = self._states.get(self._key(row))
+        return previous is not None and previous.result_fingerprint == state.result_fingerprint
+
+    def update(self, row: Row, state: RowState | None) -> None:
+        with self._lock:
+            self._pending[self._key(row)] = state
+
+    def pending_states(self) -> dict[tuple[int, str], RowState | None]:
+        """The states updated this cycle, to commit once their upload went through."""
+        with self._lock:
+            return dict(self._pending)
+
+    def commit(self, states: dict[tuple[int, str], RowState | None] | None = None) -> None:
+        """Keep ``states`` (default: this cycle's updates) as the last uploaded ones."""
+        with self._lock:
+            if states is None:
+                states, self._pending = self._pending, {}
+            for key, state in states.items():
+                if state is None:
+                    self._states.pop(key, None)
+                else:
+                    self._states[key] = state
+
+
+def is_incremental_mode() -> bool:
+    return os.getenv("INCREMENTAL_MODE", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+_tracker_lock = threading.Lock()
+_tracker: ChangeTracker | None = None
+
+
+def get_change_tracker() -> ChangeTracker | None:
+    """The process-wide tracker, or None when INCREMENTAL_MODE is off."""
+    global _tracker
+    if not is_incremental_mode():
+        return None
+    with _tracker_lock:
+        if _tracker is None:
+            try:
+                full_refresh_every = int(os.getenv("FULL_REFRESH_EVERY"))
+            except Exception:
+                full_refresh_every = DEFAULT_FULL_REFRESH_EVERY
+            _tracker = ChangeTracker(full_refresh_every)
+        return _tracker
@@ -1,17 +1,82 @@
+import json
 import os
+import threading
+import time
+from datetime import datetime
 
+import constants
 from utils.google_api import StockManager
 
+DEFAULT_CNY_RATE_TTL = 3600
+DEFAULT_CNY_RATE_RETRY_INTERVAL = 30
 
-def getCNYRate() -> float:
+_cny_rate_lock = threading.Lock()
+_cny_rate: float | None = None
+_cny_rate_expires_at: float = 0
+
+
+def _get_cny_rate_ttl() -> float:
+    try:
+        return float(os.getenv("CNY_RATE_TTL"))
+    except Exception:
+        return DEFAULT_CNY_RATE_TTL
+
+
+def _get_cny_rate_retry_interval() -> float:
+    try:
+        return float(os.getenv("CNY_RATE_RETRY_INTERVAL"))
+    except Exception:
+        return DEFAULT_CNY_RATE_RETRY_INTERVAL
+
+
+def _read_cny_rate_from_sheet() -> float:
+    sheet_manager = StockManager(os.getenv("CNY_RATE_SPREADSHEET_ID"))
+    return sheet_manager.get_cell_float_value(f"'{os.getenv('CNY_RATE_SHEET_NAME')}'!{os.getenv('CNY_RATE_CELL')}")
+
+
+def _save_last_known_cny_rate(rate: float) -> None:
     try:
-        sheet_manager = StockManager(os.getenv("CNY_RATE_SPREADSHEET_ID"))
-        cell_value = sheet_manager.get_cell_float_value(f"'{os.getenv('CNY_RATE_SHEET_NAME')}'!{os.getenv('CNY_RATE_CELL')}")
-        # _rate_sheet = os.getenv("CNY_RATE_SPREADSHEET_ID")
-        # _rate_worksheet = os.getenv("CNY_RATE_SHEET_NAME")
-        # _cell = os.getenv("CNY_RATE_CELL")
-        # return gs.load_cell_value(_rate_sheet, _rate_worksheet, _cell)
-        return cell_value
+        os.makedirs(os.path.dirname(constants.CNY_RATE_PATH), exist_ok=True)
+        tmp_path = f"{constants.CNY_RATE_PATH}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"rate": rate, "updated_at": datetime.now().isoformat()}, file)
+        os.replace(tmp_path, constants.CNY_RATE_PATH)
     except Exception as e:
-        print(f"Error reading CNY rate: {e}")
-        return 1
+        print(f"Error saving CNY rate: {e}")
+
+
+def _load_last_known_cny_rate() -> float | None:
+    try:
+        with open(constants.CNY_RATE_PATH, encoding="utf-8") as file:
+            return float(json.load(file)["rate"])
+    except Exception:
+        return None
+
+
+def getCNYRate() -> float:
+    """
+    CNY rate from the rate sheet, read at most once per CNY_RATE_TTL seconds and
+    shared by all worker threads. If the sheet can't be read the last rate that
+    was read successfully (kept in constants.CNY_RATE_PATH) is used instead, and
+    the sheet is tried again after CNY_RATE_RETRY_INTERVAL seconds.
+
+    :raises Exception: When the sheet fails and no rate was ever read.
+    """
+    global _cny_rate, _cny_rate_expires_at
+    with _cny_rate_lock:
+        if _cny_rate is not None and time.monotonic() < _cny_rate_expires_at:
+            return _cny_rate
+        try:
+            rate = _read_cny_rate_from_sheet()
+            _save_last_known_cny_rate(rate)
+            ttl = _get_cny_rate_ttl()
+        except Exception as e:
+            print(f"Error reading CNY rate: {e}")
+            rate = _cny_rate if _cny_rate is not None else _load_last_known_cny_rate()
+            if rate is None:
+                raise Exception("No CNY rate available") from e
+            print(f"Using last known CNY rate: {rate}")
+            ttl = min(_get_cny_rate_retry_interval(), _get_cny_rate_ttl())
+        _cny_rate = rate
+        _cny_rate_expires_at = time.monotonic() + ttl
+        return rate
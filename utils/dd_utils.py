@@ -3,10 +3,27 @@ import re
 from dataclasses import dataclass, asdict
 
 import requests
-from bs4 import BeautifulSoup, Tag
+from bs4 import Tag
 from typing import List, Dict, Any, Optional, Tuple
 
 from model.sheet_model import DD
+from utils import metrics, rate_limiter
+from utils.html_parser import make_soup, class_strainer, first_tags_by_class
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+}
+
+LISTING_STRAINER = class_strainer("goods-list-item")
+LISTING_FIELD_CLASSES = (
+    "goods-list-title",
+    "game-qufu-attr",
+    "goods-price",
+    "kucun",
+    "width233",
+    "game-reputation",
+    "im-buy-btn",
+)
 
 
 class FilterParams:
@@ -40,9 +57,11 @@ class DD373Product:
     def from_html_element(cls, item: Tag, domain: str = "https://www.dd373.com") -> "DD373Product":
         """Create a DD373Product instance from a BeautifulSoup Tag element"""
         product = cls()
+        # Walk the listing once, the selectors below only look inside the small field tags
+        fields = first_tags_by_class(item, LISTING_FIELD_CLASSES)
 
         # Title and URL
-        title_elem = item.select_one('.goods-list-title')
+        title_elem = fields.get('goods-list-title')
         if title_elem:
             product.title = title_elem.text.strip()
             href = title_elem.get('href', '')
@@ -55,13 +74,13 @@ class DD373Product:
                 product.product_id = href.split('/detail-')[1].split('.html')[0]
 
         # Server info
-        server_info = item.select_one('.game-qufu-attr')
+        server_info = fields.get('game-qufu-attr')
         if server_info:
             servers = [a.text.strip() for a in server_info.select('a')]
             product.server_info = '/'.join(servers) if servers else ''
 
         # Price
-        price_elem = item.select_one('.goods-price span')
+        price_elem = fields['goods-price'].find('span') if 'goods-price' in fields else None
         if price_elem:
             price_text = price_elem.text.strip()
             try:
@@ -70,7 +89,7 @@ class DD373Product:
                 product.price = 0.0
 
         # Stock
-        stock_elem = item.select_one('.kucun span')
+        stock_elem = fields['kucun'].find('span') if 'kucun' in fields else None
         if stock_elem:
             try:
                 product.stock = int(stock_elem.text.strip())
@@ -78,7 +97,7 @@ class DD373Product:
                 product.stock = 0
 
         # Exchange rates
-        rates_div = item.select_one('.width233')
+        rates_div = fields.get('width233')
         if rates_div:
             rate_texts = [p.text.strip() for p in rates_div.select('p')]
             if len(rate_texts) >= 2:
@@ -86,7 +105,7 @@ class DD373Product:
                 product.exchange_rate_2 = rate_texts[1]
 
         # Credit rating based on icon type and count
-        reputation = item.select_one('.game-reputation')
+        reputation = fields.get('game-reputation')
         if reputation:
             hearts = len(reputation.select('i.icon-heart'))
             diamonds = len(reputation.select('i.icon-bluediamond'))
@@ -104,8 +123,8 @@ class DD373Product:
                 product.credit_rating = 10 + crowns
 
         # Purchase URL
-        buy_btn = item.select_one('.shop-btn-group a.im-buy-btn')
-        if buy_btn:
+        buy_btn = fields.get('im-buy-btn')
+        if buy_btn and buy_btn.name == 'a':
             href = buy_btn.get('href', '')
             if href and not href.startswith('http'):
                 href = f"https:{href}"
@@ -138,23 +157,36 @@ def get_dd373_listings(url: str) -> List[DD373Product]:
     Returns:
         A list of DD373Product objects
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    }
+    rate_limiter.acquire(url)
+    response = requests.get(url, headers=DEFAULT_HEADERS)
+    response.raise_for_status()
 
-    # Extract domain for complete URLs
-    domain = url.split('/s-')[0] if '/s-' in url else 'https://www.dd373.com'
+    return parse_dd373_listings(response.text, dd373_domain(url))
+
+
+def dd373_domain(url: str) -> str:
+    """Domain the relative product URLs of a DD373 search page are resolved against"""
+    return url.split('/s-')[0] if '/s-' in url else 'https://www.dd373.com'
 
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+def parse_dd373_listings(html: str, domain: str = "https://www.dd373.com") -> List[DD373Product]:
+    """
+    Parses the product listings of a DD373 search page
+
+    Args:
+        html: The page html
+        domain: Prefix for the relative product URLs
 
-    # Find all product listings
-    goods_list_items = soup.select('div.goods-list-item')
+    Returns:
+        A list of DD373Product objects
+    """
+    with metrics.span("parse", source="dd"):
+        # Only the listings are built into a tree
+        soup = make_soup(html, LISTING_STRAINER)
+        goods_list_items = soup.select('div.goods-list-item')
 
-    # Create product objects from HTML elements
-    return [DD373Product.from_html_element(item, domain) for item in goods_list_items]
+        # Create product objects from HTML elements
+        return [DD373Product.from_html_element(item, domain) for item in goods_list_items]
 
 
 def _filter_valid_offer_item(listOffers: List[DD373Product], filterParams: FilterParams) -> List[DD373Product]:
@@ -173,12 +205,13 @@ def _filter_valid_offer_item(listOffers: List[DD373Product], filterParams: Filte
     return valid_offers
 
 
-def get_dd_min_price(dd: DD) -> Optional[Tuple[float, str]]:
+def get_dd_min_price(dd: DD, list_offers: Optional[List[DD373Product]] = None) -> Optional[Tuple[float, str]]:
     """
     Get the minimum price from the payload
 
     Args:
         dd: DD object gets from payload
+        list_offers: Listings already fetched for DD_PRODUCT_COMPARE, fetched here when None
 
     Returns:
         Minimum price
@@ -186,8 +219,8 @@ def get_dd_min_price(dd: DD) -> Optional[Tuple[float, str]]:
     _filterParams = FilterParams()
     _filterParams.stock_min = dd.DD_STOCKMIN
     _filterParams.level_min = dd.DD_LEVELMIN
-    list_offers = []
-    list_offers = get_dd373_listings(dd.DD_PRODUCT_COMPARE)
+    if list_offers is None:
+        list_offers = get_dd373_listings(dd.DD_PRODUCT_COMPARE)
     filter_list = _filter_valid_offer_item(list_offers, _filterParams)
 
     if not filter_list:
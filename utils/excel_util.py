@@ -1,8 +1,8 @@
 import os
-import shutil
+from functools import lru_cache
 from typing import List, Dict
 
-import pandas as pd
+from openpyxl import Workbook, load_workbook
 from pydantic import BaseModel
 
 from constants import TEMPLATE_FOLDER
@@ -52,15 +52,6 @@ class ItemTemplate(BaseModel):
         arbitrary_types_allowed = True
 
 
-def load_template(template_name: str) -> pd.DataFrame:
-    template_path = os.path.join(TEMPLATE_FOLDER, template_name)
-    return pd.read_excel(template_path)
-
-
-def write_template_to_file(file_path: str, template_df: pd.DataFrame):
-    template_df.to_excel(file_path, index=False, sheet_name="offer details")
-
-
 def currency_templates_to_dicts(templates: List[CurrencyTemplate]) -> List[Dict[str, any]]:
     return [template.model_dump(mode="json") for template in templates]
 
@@ -69,105 +60,6 @@ def item_templates_to_dicts(templates: List[ItemTemplate]) -> List[Dict[str, any
     return [template.model_dump(mode="json") for template in templates]
 
 
-# def write_data_to_xlsx(file_path: str, data: List[Dict[str, any]], mode: str):
-#     # Read the first line of the existing file
-#     first_line = None
-#     if os.path.exists(file_path):
-#         df_existing = pd.read_excel(file_path, nrows=0)  # Read only the header
-#         if not df_existing.columns.empty:
-#             first_line = df_existing.columns.tolist()  # Get the header as a list
-#
-#     # Create DataFrame using only the values from the dictionary
-#     df_new = pd.DataFrame([list(d.values()) for d in data], columns=first_line)
-#
-#     # Modify the DataFrame based on the mode
-#     if mode == "currency":
-#         #split data into many list base on they on the same game
-#         df_new = df_new.groupby("game").apply(lambda x: x.reset_index(drop=True))
-#         #save to file
-#         df_new.to_excel(file_path, index=False, sheet_name=f"{df_new['game'][0]}")
-#
-#     # Keep only the first value in the "Description" column
-#     if "Description" in df_new.columns:
-#         df_new.loc[1:, "Description"] = ""
-#     #filter row with Price Per Unit == 0
-#     try:
-#         df_new = df_new[df_new["Price Per Unit"] != 0]
-#         # filer Total Units > 10000 then set Total Units = 10000
-#         df_new.loc[df_new["Total Units"] > 10000, "Total Units"] = 10000
-#     except KeyError:
-#         pass
-#
-#     # Write the new content to the file with the specified sheet name
-#     df_new.to_excel(file_path, index=False, sheet_name="offer details")
-
-def write_data_to_xlsx(file_path: str, data: List[Dict[str, any]]):
-    """
-    Writes data to separate Excel files based on the 'game' column value,
-    with modifications based on the mode.
-
-    Parameters:
-        file_path (str): Path to save the Excel files.
-        data (List[Dict[str, Any]]): List of dictionaries containing the data.
-    """
-    # Read the header (first line) of the existing file, if it exists
-    first_line = None
-    if os.path.exists(file_path):
-        df_existing = pd.read_excel(file_path, nrows=0)  # Read only the header
-        if not df_existing.columns.empty:
-            first_line = df_existing.columns.tolist()  # Get the header as a list
-    # remove file_path
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    # Create DataFrame using the provided data
-    df_new = pd.DataFrame([list(d.values()) for d in data], columns=first_line)
-
-    # Process based on the mode
-    if "Game" in df_new.columns or "game" in df_new.columns:
-        try:
-            grouped = df_new.groupby("Game")
-        except KeyError:
-            grouped = df_new.groupby("game")
-        for game, group in grouped:
-            # Reset the index for each group
-            game = str(game).replace(" / ", "_").replace(" ", "_").replace(":", "_")
-            group.reset_index(drop=True, inplace=True)
-
-            # Save each group to a separate Excel file
-            if "Item Category 1" not in group.columns:
-                if "Description" in group.columns:
-                    group.loc[1:, "Description"] = ""
-            # Ensure the "Description" column keeps only the first value
-            try:
-                if "Price Per Unit" in group.columns:
-                    group = group[group["Price Per Unit"] != 0]
-            except KeyError:
-                print("The 'Price Per Unit' column is not present in the file")
-
-            # Cap "Total Units" to a maximum of 10,000 if applicable
-            if "Total Units" in group.columns:
-                group.loc[group["Total Units"] > 10000, "Total Units"] = 10000
-            game_file_path = os.path.join(os.path.dirname(file_path), f"{game}.xlsx")
-            group.to_excel(game_file_path, index=False, sheet_name="offer details")
-            print("saved to", game_file_path)
-    else:
-        raise ValueError("The 'Game' column is required for 'currency' mode or it not currency file")
-
-
-def clear_output_directory(directory: str):
-    if os.path.exists(directory):
-        for filename in os.listdir(directory):
-            file_path = os.path.join(directory, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-                print(f"Deleted {file_path}")
-            except Exception as e:
-                print(f"Failed to delete {file_path}. Reason: {e}")
-
-
 def list_files_in_output(directory: str):
     files = []
     exceptFile = ["new_currency_template.xlsx", "new_item_template.xlsx", "__init__.py"]
@@ -178,23 +70,83 @@ def list_files_in_output(directory: str):
     return files
 
 
-def create_file_from_template(template_name: str, new_file_path: str, data: List[Dict[str, any]]):
-    # Ensure the output directory exists
-    os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
-    template_content = load_template(template_name)
-    write_template_to_file(new_file_path, template_content)
-    write_data_to_xlsx(new_file_path, data)
+@lru_cache(maxsize=None)
+def load_template_header(template_name: str) -> tuple[str, ...]:
+    """The column names in the first row of a template, read once per process."""
+    workbook = load_workbook(os.path.join(TEMPLATE_FOLDER, template_name), read_only=True)
+    try:
+        header = list(next(workbook.active.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+    finally:
+        workbook.close()
+    while header and header[-1] is None:
+        header.pop()
+    # Same names pandas gives the blank header cells
+    return tuple(f"Unnamed: {i}" if value is None else str(value) for i, value in enumerate(header))
 
 
-def read_xlsx_file(file_path: str) -> List[Dict[str, any]]:
-    df = pd.read_excel(file_path)
-    return df.to_dict(orient='records')
+def game_file_name(game) -> str:
+    return str(game).replace(" / ", "_").replace(" ", "_").replace(":", "_")
 
 
-def write_xlsx_file(file_path: str, data: List[Dict[str, any]]):
-    df = pd.DataFrame(data)
-    df.to_excel(file_path, index=False)
-    return True
+def write_game_files(directory: str, header: tuple[str, ...], data: List[Dict[str, any]]) -> List[str]:
+    """
+    Write the rows of every game to <directory>/<game>.xlsx, one write-only
+    workbook at a time. Only the first Description of a currency file is kept,
+    rows with a "Price Per Unit" of 0 are dropped and "Total Units" is capped
+    at 10000.
+
+    :param header: Column names; each dict holds the values of one row in this order.
+    :return: The written files.
+    """
+    if "Game" in header:
+        game_index = header.index("Game")
+    elif "game" in header:
+        game_index = header.index("game")
+    else:
+        raise ValueError("The 'Game' column is required for 'currency' mode or it not currency file")
+    description_index = header.index("Description") \
+        if "Description" in header and "Item Category 1" not in header else None
+    price_index = header.index("Price Per Unit") if "Price Per Unit" in header else None
+    total_units_index = header.index("Total Units") if "Total Units" in header else None
+
+    games: dict[str, list[list]] = {}
+    for d in data:
+        values = list(d.values())
+        if len(values) != len(header):
+            raise ValueError(f"{len(header)} columns passed, passed data had {len(values)} columns")
+        game = values[game_index]
+        if game is None or game != game:
+            continue
+        games.setdefault(game, []).append(values)
+
+    written = []
+    for game in sorted(games):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("offer details")
+        sheet.append(header)
+        for position, values in enumerate(games[game]):
+            if description_index is not None and position > 0:
+                values[description_index] = ""
+            if price_index is not None and values[price_index] == 0:
+                continue
+            if total_units_index is not None and isinstance(values[total_units_index], (int, float)) \
+                    and values[total_units_index] > 10000:
+                values[total_units_index] = 10000
+            sheet.append(values)
+        game_file_path = os.path.join(directory, f"{game_file_name(game)}.xlsx")
+        workbook.save(game_file_path)
+        written.append(game_file_path)
+        print("saved to", game_file_path)
+    return written
+
+
+def create_file_from_template(template_name: str, new_file_path: str, data: List[Dict[str, any]]):
+    """Write one file per game next to new_file_path, with the template's columns."""
+    # Ensure the output directory exists
+    os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
+    if os.path.exists(new_file_path):
+        os.remove(new_file_path)
+    return write_game_files(os.path.dirname(new_file_path), load_template_header(template_name), data)
 
 
 def sample_usage():
@@ -225,7 +177,6 @@ def sample_usage():
 
     currency_data = currency_templates_to_dicts(currency_templates)
     # item_data = item_templates_to_dicts(item_templates)
-    clear_output_directory("storage/pa_template/item")
     create_file_from_template("currency_template.xlsx", "storage/pa_template/currency/new_currency_template.xlsx",
                               currency_data)
     # create_file_from_template("item_template.xlsx", "storage/pa_template/item/new_item_template.xlsx", item_data)
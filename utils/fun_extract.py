@@ -1,21 +1,31 @@
+from typing import Final
+
 import requests
 from requests.exceptions import HTTPError
 
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 
 from decorator.retry import retry
 from .exceptions import FUNCrawlerError
+from .html_parser import make_soup, class_strainer, first_tags_by_class
+from . import metrics, rate_limiter
 
 from model.crawl_model import FUNOfferItem
 
+DEFAULT_COOKIES: Final[dict[str, str]] = {"cy": "usd"}
+
+OFFER_STRAINER: Final[SoupStrainer] = class_strainer("tc-item", "showcase-filter-input")
+OFFER_FIELD_CLASSES: Final[tuple[str, ...]] = ("media-user-name", "tc-amount", "tc-price")
+
 
-@retry(retries=3, delay=1.2, exception=HTTPError)
-def __get_soup(
+@retry(retries=3, delay=1.2, exception=(HTTPError, requests.ConnectionError, requests.Timeout), backoff=2, jitter=0.5)
+def __get_html(
     url: str,
-) -> BeautifulSoup:
-    res = requests.get(url=url, cookies={"cy": "usd"})
+) -> str:
+    rate_limiter.acquire(url)
+    res = requests.get(url=url, cookies=DEFAULT_COOKIES)
     res.raise_for_status()
-    return BeautifulSoup(res.text, "html.parser")
+    return res.text
 
 
 def __extract_filters_data(
@@ -48,9 +58,9 @@ def __extract_filters_data(
 
 
 def __extract_seller_name(
-    tag: Tag,
+    fields: dict[str, Tag],
 ) -> str:
-    seller_name_tag = tag.select_one(".media-user-name")
+    seller_name_tag = fields.get("media-user-name")
     if seller_name_tag:
         seller_name = seller_name_tag.get_text(strip=True)
         if seller_name:
@@ -60,9 +70,9 @@ def __extract_seller_name(
 
 
 def __extract_fun_in_stock(
-    tag: Tag,
+    fields: dict[str, Tag],
 ) -> int:
-    in_stock_tag = tag.select_one(".tc-amount")
+    in_stock_tag = fields.get("tc-amount")
     if in_stock_tag:
         in_stock_txt = in_stock_tag.get_text(strip=True).replace(" ", "")
 
@@ -76,9 +86,9 @@ def __extract_fun_in_stock(
 
 
 def __extract_fun_price(
-    tag: Tag,
+    fields: dict[str, Tag],
 ) -> float:
-    price_tag = tag.select_one(".tc-price")
+    price_tag = fields.get("tc-price")
     if price_tag:
         unit_tags = price_tag.select(".unit")
         for unit_tag in unit_tags:
@@ -97,22 +107,21 @@ def __extract_fun_offer_items_from_soup(
 ) -> list[FUNOfferItem]:
     fun_offer_items = []
     for offer_item_tag in offer_item_tags:
+        fields = first_tags_by_class(offer_item_tag, OFFER_FIELD_CLASSES)
         fun_offer_items.append(
             FUNOfferItem(
-                seller=__extract_seller_name(offer_item_tag),
-                in_stock=__extract_fun_in_stock(offer_item_tag),
-                price=__extract_fun_price(offer_item_tag),
+                seller=__extract_seller_name(fields),
+                in_stock=__extract_fun_in_stock(fields),
+                price=__extract_fun_price(fields),
             )
         )
     return fun_offer_items
 
 
-@retry(10, 0.25, HTTPError)
-def fun_extract_offer_items(
-    url: str,
+def __extract_filtered_offer_items(
+    soup: BeautifulSoup,
     filters: list[str],
 ) -> list[FUNOfferItem]:
-    soup = __get_soup(url)
     filters_data = __extract_filters_data(soup, filters)
     filter_data_txt = ""
     for filter in filters_data:
@@ -121,3 +130,18 @@ def fun_extract_offer_items(
     offer_item_tags = soup.select(f".tc-item{filter_data_txt}")
     fun_offer_items = __extract_fun_offer_items_from_soup(offer_item_tags)
     return fun_offer_items
+
+
+def fun_extract_offer_items(
+    url: str,
+    filters: list[str],
+) -> list[FUNOfferItem]:
+    return fun_extract_offer_items_from_html(__get_html(url), filters)
+
+
+def fun_extract_offer_items_from_html(
+    html: str,
+    filters: list[str],
+) -> list[FUNOfferItem]:
+    with metrics.span("parse", source="fun"):
+        return __extract_filtered_offer_items(make_soup(html, OFFER_STRAINER), filters)
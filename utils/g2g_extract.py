@@ -2,10 +2,12 @@ from typing import Final
 import requests
 from decorator.retry import retry
 from requests import HTTPError, Session
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 
 from model.crawl_model import DeliveryTime, TimeUnit, G2GOfferItem
 from .exceptions import G2GCrawlerError
+from .html_parser import make_soup, id_strainer
+from . import metrics, rate_limiter
 
 import re
 
@@ -26,15 +28,21 @@ DEFAULT_COOKIES: Final[dict[str, str]] = {
     "g2g_regional": '{"country": "VN", "currency": "USD", "language": "en"}'
 }
 
+OFFER_STRAINER: Final[SoupStrainer] = id_strainer("pre_checkout_sls_offer")
+OFFER_FIELD_CLASSES: Final[tuple[str, ...]] = ("seller__name-detail", "offer-price-amount")
+OFFER_FIELD_LABELS: Final[tuple[str, ...]] = ("Delivery speed", "Stock", "Min. purchase")
+NUMBER_PATTERN: Final[re.Pattern] = re.compile(r"(\d+)([a-zA-Z]*)")
 
-@retry(retries=5, delay=1.2, exception=HTTPError)
-def __get_soup(
+
+@retry(retries=5, delay=1.2, exception=HTTPError, backoff=2, max_delay=10, jitter=0.5)
+def __get_html(
         url: str,
-) -> BeautifulSoup:
+) -> str:
     try:
         session = Session()
         session.headers.update(DEFAULT_HEADERS) # Set default headers for the session
 
+        rate_limiter.acquire(url)
         res = session.get(
             url=url,
             cookies=DEFAULT_COOKIES, # Pass cookies to the specific request
@@ -43,7 +51,7 @@ def __get_soup(
         # Check for HTTP errors AFTER the request is made
         res.raise_for_status() # This will raise HTTPError for 4xx/5xx responses
 
-        return BeautifulSoup(res.text, "html.parser")
+        return res.text
 
     # Catch specific HTTPError for retries
     except HTTPError as e:
@@ -67,97 +75,110 @@ def __g2g_extract_offer_items_from_soup(
     for offer_item_tag in soup.select(
             "#pre_checkout_sls_offer .other_offer-desk-main-box"
     ):
+        fields, labelled = __g2g_extract_offer_fields(offer_item_tag)
         g2g_offer_items.append(
             G2GOfferItem(
-                seller_name=__g2g_extract_seller_name(offer_item_tag),
-                delivery_time=__g2g_extract_delivery_time(offer_item_tag),
-                stock=__g2g_extract_stock(offer_item_tag),
-                min_purchase=__g2g_extract_min_purchase(offer_item_tag),
-                price_per_unit=__g2g_extract_price_per_unit(offer_item_tag),
+                seller_name=__g2g_extract_seller_name(fields),
+                delivery_time=__g2g_extract_delivery_time(labelled),
+                stock=__g2g_extract_stock(labelled),
+                min_purchase=__g2g_extract_min_purchase(labelled),
+                price_per_unit=__g2g_extract_price_per_unit(fields),
             )
         )
 
     return g2g_offer_items
 
 
-def __g2g_extract_seller_name(
+def __g2g_extract_offer_fields(
         tag: Tag,
+) -> tuple[dict[str, Tag], dict[str, str]]:
+    """
+    Walk an offer once.
+
+    :return: The first tag of each field class, and the value text of each labelled
+        ``.flex-1.align-self`` block (Delivery speed, Stock, Min. purchase).
+    """
+    fields: dict[str, Tag] = {}
+    labelled: dict[str, str] = {}
+    for child in tag.find_all(True):
+        classes = child.get("class", ())
+        for class_name in classes:
+            if class_name in OFFER_FIELD_CLASSES and class_name not in fields:
+                fields[class_name] = child
+        if "flex-1" in classes and "align-self" in classes:
+            flex_text = child.get_text(strip=True)
+            for label in OFFER_FIELD_LABELS:
+                if label in flex_text and label not in labelled:
+                    lower_tag = child.select_one(".offer__content-lower-items")
+                    if lower_tag:
+                        labelled[label] = lower_tag.get_text(strip=True)
+    return fields, labelled
+
+
+def __g2g_extract_seller_name(
+        fields: dict[str, Tag],
 ) -> str:
-    seller_name_tag = tag.select_one(".seller__name-detail")
+    seller_name_tag = fields.get("seller__name-detail")
     if seller_name_tag:
         return seller_name_tag.get_text(strip=True)
     raise G2GCrawlerError("Can't get seller name")
 
 
 def __g2g_extract_delivery_time(
-        tag: Tag,
+        labelled: dict[str, str],
 ) -> DeliveryTime:
     UNIT_MAP: Final[dict[str, str]] = {
         "h": "Hours",
     }
 
-    for flex_tag in tag.select(".flex-1.align-self"):
-        if "Delivery speed" in flex_tag.get_text(strip=True):
-            lower_tag = flex_tag.select_one(".offer__content-lower-items")
-            if lower_tag:
-                pattern = r"(\d+)([a-zA-Z]*)"
-                match = re.match(pattern, lower_tag.get_text(strip=True))
-                if match:
-                    value = match.group(1)
-                    unit = match.group(2)
-                    if unit in UNIT_MAP:
-                        return DeliveryTime(
-                            value=int(value),
-                            unit=TimeUnit(UNIT_MAP[unit]),
-                        )
+    match = NUMBER_PATTERN.match(labelled.get("Delivery speed", ""))
+    if match:
+        value = match.group(1)
+        unit = match.group(2)
+        if unit in UNIT_MAP:
+            return DeliveryTime(
+                value=int(value),
+                unit=TimeUnit(UNIT_MAP[unit]),
+            )
     raise G2GCrawlerError("Can't extract delivery time")
 
 
 def __g2g_extract_stock(
-        tag: Tag,
+        labelled: dict[str, str],
 ) -> int:
-    for flex_tag in tag.select(".flex-1.align-self"):
-        if "Stock" in flex_tag.get_text(strip=True):
-            lower_tag = flex_tag.select_one(".offer__content-lower-items")
-            if lower_tag:
-                pattern = r"(\d+)([a-zA-Z]*)"
-                lower_tag_text = lower_tag.get_text(strip=True).replace(",", "")
-                match = re.match(pattern, lower_tag_text)
-                if match:
-                    value = match.group(1)
-                    return int(value)
+    match = NUMBER_PATTERN.match(labelled.get("Stock", "").replace(",", ""))
+    if match:
+        return int(match.group(1))
     raise G2GCrawlerError("Can't extract Stock")
 
 
 def __g2g_extract_min_purchase(
-        tag: Tag,
+        labelled: dict[str, str],
 ) -> int:
-    for flex_tag in tag.select(".flex-1.align-self"):
-        if "Min. purchase" in flex_tag.get_text(strip=True):
-            lower_tag = flex_tag.select_one(".offer__content-lower-items")
-            if lower_tag:
-                pattern = r"(\d+)([a-zA-Z]*)"
-                lower_tag_text = lower_tag.get_text(strip=True).replace(",", "")
-                match = re.match(pattern, lower_tag_text)
-                if match:
-                    value = match.group(1)
-                    return int(value)
+    match = NUMBER_PATTERN.match(labelled.get("Min. purchase", "").replace(",", ""))
+    if match:
+        return int(match.group(1))
     raise G2GCrawlerError("Can't extract Min purchase")
 
 
 def __g2g_extract_price_per_unit(
-        tag: Tag,
+        fields: dict[str, Tag],
 ) -> float:
-    price_tag = tag.select_one(".offer-price-amount")
+    price_tag = fields.get("offer-price-amount")
     if price_tag:
         return float(price_tag.get_text(strip=True))
 
     raise G2GCrawlerError("Can't extract Price per unit")
 
 
-@retry(retries=5, delay=0.5, exception=HTTPError)
 def g2g_extract_offer_items(
         url: str,
 ) -> list[G2GOfferItem]:
-    soup = __get_soup(url)
-    return __g2g_extract_offer_items_from_soup(soup)
+    return g2g_extract_offer_items_from_html(__get_html(url))
+
+
+def g2g_extract_offer_items_from_html(
+        html: str,
+) -> list[G2GOfferItem]:
+    with metrics.span("parse", source="g2g"):
+        return __g2g_extract_offer_items_from_soup(make_soup(html, OFFER_STRAINER))
@@ -1,7 +1,196 @@
+import os
+import queue
+import threading
 import time
+from contextlib import contextmanager
+from typing import Iterator
 
+import google_auth_httplib2
+import httplib2
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+from utils.page_cache import PageCache
+
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+HTTP_TIMEOUT = 30
+DEFAULT_HTTP_POOL_SIZE = 8
+
+_service_lock = threading.Lock()
+_credentials_cache: dict[str, Credentials] = {}
+_service_cache: dict[str, object] = {}
+
+
+def _get_credentials(credentials_file: str) -> Credentials:
+    with _service_lock:
+        credentials = _credentials_cache.get(credentials_file)
+        if credentials is None:
+            credentials = Credentials.from_service_account_file(credentials_file, scopes=SHEETS_SCOPES)
+            _credentials_cache[credentials_file] = credentials
+        return credentials
+
+
+class _HttpPool:
+    """
+    Up to ``size`` AuthorizedHttp connections shared by every thread of the
+    process. httplib2.Http is not thread-safe, so each one serves a single
+    request at a time; idle ones keep their keep-alive connections.
+    """
+
+    def __init__(self, credentials: Credentials, size: int) -> None:
+        self.credentials = credentials
+        self._slots = threading.BoundedSemaphore(max(1, size))
+        self._idle: queue.LifoQueue[google_auth_httplib2.AuthorizedHttp] = queue.LifoQueue()
+
+    @contextmanager
+    def connection(self) -> Iterator[google_auth_httplib2.AuthorizedHttp]:
+        with self._slots:
+            try:
+                http = self._idle.get_nowait()
+            except queue.Empty:
+                http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            try:
+                yield http
+            finally:
+                self._idle.put(http)
+
+
+class _PooledHttpRequest(HttpRequest):
+    """An HttpRequest executed on a connection checked out of an _HttpPool."""
+
+    def __init__(self, pool: _HttpPool, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._pool = pool
+
+    def execute(self, http=None, num_retries=0):
+        if http is not None:
+            return super().execute(http=http, num_retries=num_retries)
+        with self._pool.connection() as pooled:
+            return super().execute(http=pooled, num_retries=num_retries)
+
+
+def _get_http_pool_size() -> int:
+    try:
+        return int(os.getenv("SHEETS_HTTP_POOL_SIZE"))
+    except Exception:
+        return DEFAULT_HTTP_POOL_SIZE
+
+
+def get_sheets_service(credentials_file: str = "key.json"):
+    """
+    Return the process-wide Sheets service for a key file.
+
+    The discovery document is parsed once; each request is executed on a
+    connection of a process-wide pool (SHEETS_HTTP_POOL_SIZE), so the service
+    can be shared by worker threads and its connections outlive them.
+    """
+    with _service_lock:
+        service = _service_cache.get(credentials_file)
+        if service is not None:
+            return service
+
+    credentials = _get_credentials(credentials_file)
+    pool = _HttpPool(credentials, _get_http_pool_size())
+
+    def _build_request(_http, *args, **kwargs):
+        return _PooledHttpRequest(pool, _http, *args, **kwargs)
+
+    service = build(
+        'sheets', 'v4',
+        http=google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT)),
+        requestBuilder=_build_request,
+        cache_discovery=False,
+        static_discovery=True,
+    )
+    with _service_lock:
+        return _service_cache.setdefault(credentials_file, service)
+
+
+def set_sheets_service(service, credentials_file: str = "key.json") -> None:
+    """Use a ready-made service for a key file, e.g. a recorded one for offline benchmarks."""
+    with _service_lock:
+        _service_cache[credentials_file] = service
+
+
+_prefetch_lock = threading.Lock()
+_prefetched_ranges: dict[tuple[str, str], dict] = {}
+
+
+def prefetch_ranges(
+        spreadsheet_id: str,
+        ranges: list[str],
+        chunk_size: int = 100,
+        credentials_file: str = "key.json",
+) -> int:
+    """
+    Read ranges of one spreadsheet with values.batchGet and keep the results in
+    memory, so later StockManager reads of the same range skip the API call.
+
+    :return: Number of ranges stored.
+    """
+    service = get_sheets_service(credentials_file)
+    ranges = list(dict.fromkeys(ranges))
+    stored = 0
+    for start in range(0, len(ranges), chunk_size):
+        chunk = ranges[start:start + chunk_size]
+        result = (
+            service.spreadsheets()
+            .values()
+            .batchGet(spreadsheetId=spreadsheet_id, ranges=chunk)
+            .execute()
+        )
+        with _prefetch_lock:
+            for range_name, value_range in zip(chunk, result.get("valueRanges", [])):
+                _prefetched_ranges[(spreadsheet_id, range_name)] = value_range
+                stored += 1
+    return stored
+
+
+def get_prefetched_range(spreadsheet_id: str, range_name: str) -> dict | None:
+    with _prefetch_lock:
+        return _prefetched_ranges.get((spreadsheet_id, range_name))
+
+
+def clear_prefetched_ranges() -> None:
+    with _prefetch_lock:
+        _prefetched_ranges.clear()
+
+
+DEFAULT_BLACKLIST_CACHE_TTL = 600
+
+_blacklist_lock = threading.Lock()
+_blacklist_cache: PageCache | None = None
+
+
+def _get_blacklist_cache() -> PageCache:
+    global _blacklist_cache
+    with _blacklist_lock:
+        if _blacklist_cache is None:
+            try:
+                ttl = float(os.getenv("BLACKLIST_CACHE_TTL"))
+            except Exception:
+                ttl = DEFAULT_BLACKLIST_CACHE_TTL
+            _blacklist_cache = PageCache(ttl, metric_name="blacklist_cache")
+        return _blacklist_cache
+
+
+def get_blacklist(spreadsheet_id: str, range_str: str) -> frozenset[str]:
+    """
+    Read a blacklist column once per (spreadsheet id, range) and keep it for
+    BLACKLIST_CACHE_TTL seconds. Rows asking for a range that is being read wait
+    for that read; other ranges are read in parallel. Failed reads are not cached.
+    """
+    return _get_blacklist_cache().get_or_fetch(
+        (spreadsheet_id, range_str),
+        lambda: frozenset(StockManager(spreadsheet_id).get_multiple_str_cells(range_str)),
+        source="blacklist",
+    )
+
+
+def invalidate_blacklists() -> None:
+    """Force the next get_blacklist calls to re-download, e.g. at the start of a cycle."""
+    _get_blacklist_cache().clear()
 
 
 class StockManager:
@@ -12,20 +201,34 @@ class StockManager:
         self.service = self._initialize_service()
 
     def _initialize_service(self):
-        credentials = Credentials.from_service_account_file(
-            self.credentials_file,
-            scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
+        return get_sheets_service(self.credentials_file)
+
+    def _get_range(self, range_name: str) -> dict:
+        prefetched = get_prefetched_range(self.spreadsheet_id, range_name)
+        if prefetched is not None:
+            return prefetched
+        return (
+            self.service.spreadsheets()
+            .values()
+            .get(spreadsheetId=self.spreadsheet_id, range=range_name)
+            .execute()
+        )
+
+    def _batch_get_ranges(self, ranges: list[str]) -> list[dict]:
+        prefetched = [get_prefetched_range(self.spreadsheet_id, range_name) for range_name in ranges]
+        if all(value_range is not None for value_range in prefetched):
+            return prefetched
+        result = (
+            self.service.spreadsheets()
+            .values()
+            .batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges)
+            .execute()
         )
-        return build('sheets', 'v4', credentials=credentials)
+        return result.get("valueRanges", [])
 
     def get_cell_float_value(self, range_name: str) -> float:
         try:
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_name)
-                .execute()
-            )
+            result = self._get_range(range_name)
             cell_value = result.get('values', [[]])[0][0]
             # Convert to integer after handling float-like values
             stock_value = float(cell_value)
@@ -39,12 +242,7 @@ class StockManager:
 
     def get_cell_stock(self, range_name: str) -> float:
         try:
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_name)
-                .execute()
-            )
+            result = self._get_range(range_name)
             cell_value = result.get('values', [[]])[0][0]
             # Convert to integer after handling float-like values
             stock_value = float(cell_value)
@@ -56,13 +254,7 @@ class StockManager:
     def get_multiple_cells(self, ranges: list[str]) -> list[int]:
         try:
             # Make a batch request for multiple ranges
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges)
-                .execute()
-            )
-            values = result.get("valueRanges", [])
+            values = self._batch_get_ranges(ranges)
             # Extract values from the response, convert to integers if possible
             cell_values = []
             for value_range in values:
@@ -77,12 +269,7 @@ class StockManager:
     def get_multiple_str_cells(self, range_str: str) -> list[str]:
         try:
             # Make a request for the single range
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_str)
-                .execute()
-            )
+            result = self._get_range(range_str)
             values = result.get("values", [])
             # Extract values from the response as strings
             cell_values = [str(cell[0]) for cell in values if cell]
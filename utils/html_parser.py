@@ -0,0 +1,49 @@
+from importlib.util import find_spec
+from typing import Iterable
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+HTML_PARSER = "lxml" if find_spec("lxml") else "html.parser"
+
+
+def class_strainer(*class_names: str) -> SoupStrainer:
+    """Keep only the elements carrying one of the classes (and everything inside them)."""
+    wanted = frozenset(class_names)
+
+    def has_wanted_class(value: str | list[str] | None) -> bool:
+        # While parsing, the class attribute may still be the raw "a b" string
+        if not value:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return not wanted.isdisjoint(value)
+
+    return SoupStrainer(attrs={"class": has_wanted_class})
+
+
+def id_strainer(element_id: str) -> SoupStrainer:
+    return SoupStrainer(id=element_id)
+
+
+def make_soup(html: str, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+    """
+    Parse html with the fastest available parser.
+
+    :param parse_only: Build the tree only for the matching elements, the rest of the page is skipped.
+    """
+    return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
+
+def first_tags_by_class(tag: Tag, class_names: Iterable[str]) -> dict[str, Tag]:
+    """
+    Walk the subtree of tag once and keep the first element found for each wanted class.
+    """
+    wanted = set(class_names)
+    found: dict[str, Tag] = {}
+    for child in tag.find_all(True):
+        for class_name in child.get("class", ()):
+            if class_name in wanted and class_name not in found:
+                found[class_name] = child
+        if len(found) == len(wanted):
+            break
+    return found
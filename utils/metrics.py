@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import constants
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms kept in memory (for the Prometheus endpoint), plus
+    every span and counter increment appended to a JSON-lines file.
+
+    The file is METRICS_FILE (default constants.METRICS_PATH); set it to an
+    empty value to turn the file off.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, Histogram]] = {}
+        self._file = None
+        self._file_checked = False
+
+    def _write_event(self, event: dict) -> None:
+        with self._lock:
+            if not self._file_checked:
+                self._file_checked = True
+                path = os.getenv("METRICS_FILE", constants.METRICS_PATH)
+                if path:
+                    try:
+                        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                        self._file = open(path, "a", encoding="utf-8", buffering=1)
+                    except Exception as e:
+                        print(f"Can't open metrics file {path}: {e}")
+            if self._file is None:
+                return
+            try:
+                self._file.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+            except Exception as e:
+                print(f"Can't write metrics event: {e}")
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        self._write_event({
+            "ts": datetime.now().isoformat(), "type": "counter", "name": name, "value": value, "labels": labels,
+        })
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, details: dict | None = None, **labels):
+        """
+        Time a block. The duration goes to the span_duration_seconds histogram
+        and a span event; an exception is counted in span_failures_total and re-raised.
+
+        :param details: Extra event fields (e.g. the row index) that are not metric labels.
+        """
+        start = time.perf_counter()
+        status = "ok"
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            status = "error"
+            error = str(e)
+            self.inc("span_failures_total", span=name, **labels)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.observe("span_duration_seconds", duration, span=name, **labels)
+            event = {
+                "ts": datetime.now().isoformat(), "type": "span", "name": name,
+                "duration": round(duration, 6), "status": status, "labels": labels,
+            }
+            if details:
+                event["details"] = details
+            if error is not None:
+                event["error"] = error
+            self._write_event(event)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', f'{bound:g}'),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    registry.observe(name, value, **labels)
+
+
+def span(name: str, details: dict | None = None, **labels):
+    return registry.span(name, details, **labels)
+
+
+def timed(name: str, **labels):
+    """Decorator form of span()."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with registry.span(name, **labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_metrics_server(port: int | None = None) -> ThreadingHTTPServer | None:
+    """
+    Serve the metrics in Prometheus text format on http://<METRICS_HOST>:<port>/metrics.
+
+    :param port: Defaults to METRICS_PORT; nothing is started when neither is set.
+    """
+    if port is None:
+        try:
+            port = int(os.getenv("METRICS_PORT"))
+        except Exception:
+            return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    host = os.getenv("METRICS_HOST", "127.0.0.1")
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import constants
+from utils.excel_util import list_files_in_output
+
+POINTER_NAME = "CURRENT"
+STAGING_PREFIX = ".staging-"
+
+
+class OutputGenerations:
+    """
+    Bulk files of every cycle in their own generation directory under
+    ``<root>/generations``. A cycle writes into a staging directory that is
+    renamed into place once complete, then ``<root>/CURRENT`` is swapped with
+    os.replace to name it, so readers only ever see a whole generation.
+
+    The previous generation is kept next to the current one (for diffing, and
+    for an upload still reading it); older ones are removed on publish.
+
+    :param root: Output directory, storage/output.
+    """
+
+    def __init__(self, root: str = constants.OUTPUT_PATH) -> None:
+        self.root = root
+        self.generations_dir = os.path.join(root, "generations")
+        self.pointer_path = os.path.join(root, POINTER_NAME)
+        self._lock = threading.Lock()
+
+    def _read_pointer(self) -> dict:
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Can't read output pointer {self.pointer_path}: {e}")
+            return {}
+
+    def _generation_dir(self, name: str | None) -> str | None:
+        if not name:
+            return None
+        path = os.path.join(self.generations_dir, name)
+        return path if os.path.isdir(path) else None
+
+    def current(self) -> str | None:
+        """Directory of the last published generation."""
+        return self._generation_dir(self._read_pointer().get("current"))
+
+    def previous(self) -> str | None:
+        """Directory of the generation published before the current one."""
+        return self._generation_dir(self._read_pointer().get("previous"))
+
+    def stage(self) -> str:
+        """
+        Create an empty staging directory, with currency/ and item/ folders, for
+        the next generation; staging directories a crash left behind are removed.
+        """
+        with self._lock:
+            os.makedirs(self.generations_dir, exist_ok=True)
+            for name in os.listdir(self.generations_dir):
+                if name.startswith(STAGING_PREFIX):
+                    shutil.rmtree(os.path.join(self.generations_dir, name), ignore_errors=True)
+            name = time.strftime("%Y%m%d-%H%M%S")
+            suffix = 0
+            while os.path.exists(os.path.join(self.generations_dir, name)):
+                suffix += 1
+                name = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+            staging = os.path.join(self.generations_dir, f"{STAGING_PREFIX}{name}")
+            for kind in ("currency", "item"):
+                os.makedirs(os.path.join(staging, kind))
+            return staging
+
+    def publish(self, staging: str) -> str:
+        """
+        Make a fully written staging directory the current generation.
+
+        :return: The generation's directory.
+        """
+        with self._lock:
+            name = os.path.basename(staging)[len(STAGING_PREFIX):]
+            path = os.path.join(self.generations_dir, name)
+            os.rename(staging, path)
+            pointer = {"current": name, "previous": self._read_pointer().get("current")}
+            tmp_path = f"{self.pointer_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(pointer, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.pointer_path)
+            for old in os.listdir(self.generations_dir):
+                if old not in pointer.values() and not old.startswith(STAGING_PREFIX):
+                    shutil.rmtree(os.path.join(self.generations_dir, old), ignore_errors=True)
+            return path
+
+
+_generations = OutputGenerations()
+
+
+def get_output_generations() -> OutputGenerations:
+    return _generations
+
+
+def current_output_files(kind: str) -> list[str]:
+    """The currency or item files of the current generation."""
+    current = _generations.current()
+    if current is None or not os.path.isdir(os.path.join(current, kind)):
+        return []
+    return list_files_in_output(os.path.join(current, kind))
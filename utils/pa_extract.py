@@ -1,72 +1,169 @@
+import json
+import os
+import re
+import threading
+from typing import Final, Mapping
+
 import execjs
-from bs4 import BeautifulSoup, Tag
+import requests
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 from requests import HTTPError
+from requests.adapters import HTTPAdapter
 
 from decorator.retry import retry
 from model.crawl_model import Seller, DeliveryTime, TimeUnit, OfferItem
 from .exceptions import PACrawlerError
-from .selenium_util import SeleniumUtil
+from .html_parser import make_soup, class_strainer, first_tags_by_class
+from . import metrics, rate_limiter
+from .selenium_util import SeleniumUtil, SeleniumPools
+
+DEFAULT_HEADERS: Final[dict[str, str]] = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 '
+                  'Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Connection': 'keep-alive',
+}
+CHALLENGE_STATUS_CODES: Final[set[int]] = {403, 429, 503}
+CHALLENGE_MARKERS: Final[list[str]] = [
+    "cf-chl",
+    # Not the bare challenge-platform path: normal pages load its jsd beacon too
+    "/cdn-cgi/challenge-platform/h/",
+    "cf-turnstile",
+    "Just a moment...",
+    "Attention Required",
+    "Checking your browser",
+    "captcha-delivery.com",
+    "_Incapsula_Resource",
+    "px-captcha",
+]
+OFFER_STRAINER: Final[SoupStrainer] = class_strainer("offer-item", "product-item")
+OFFER_FIELD_CLASSES: Final[tuple[str, ...]] = (
+    "offerid",
+    "offer-title-lv1",
+    "offer-title-lv2",
+    "username",
+    "OLP-delivery-text",
+    "offer-price-tag",
+    "OLP-input-number",
+)
+
+_session_lock = threading.Lock()
+_session: requests.Session | None = None
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(DEFAULT_HEADERS)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def harvest_browser_session(browser: SeleniumUtil) -> None:
+    """Copy cookies and user agent from a browser that passed the site challenge into the HTTP session."""
+    session = _get_session()
+    try:
+        user_agent = browser.driver.execute_script("return navigator.userAgent")
+        if user_agent:
+            session.headers["User-Agent"] = user_agent
+        for cookie in browser.driver.get_cookies():
+            session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/")
+            )
+    except Exception as e:
+        print(f"Can't harvest browser session: {e}")
+
+
+def is_challenge_page(status_code: int, html: str, headers: Mapping[str, str] | None = None) -> bool:
+    """
+    Whether the site answered with a bot check instead of the page. A listing
+    without offers is a real page, so only the challenge's own markers count.
+    """
+    if status_code in CHALLENGE_STATUS_CODES:
+        return True
+    if headers is not None and headers.get("cf-mitigated", "").lower() == "challenge":
+        return True
+    return any(marker in html for marker in CHALLENGE_MARKERS)
 
 
 @retry(retries=3, delay=1.2, exception=HTTPError)
-def __get_soup(url: str, browser: SeleniumUtil) -> BeautifulSoup:
-    browser.driver.get(url)
-    res = browser.driver.page_source
-    return BeautifulSoup(res, "html.parser")
+def __get_html(url: str, browser: SeleniumUtil) -> str:
+    rate_limiter.acquire(url)
+    browser.get(url)
+    return browser.driver.page_source
 
 
-def __extract_offer_items_from_soup(soup: BeautifulSoup) -> list[OfferItem]:
-    offer_items = []
-    offers_model = __extract_min_unit_and_min_stock(soup)
-
-    for offer_item_tag in soup.select(".offer-item"):
-        offer_item_id = __extract_offer_id(offer_item_tag)
-        offer_items.append(
-            OfferItem(
-                offer_id=offer_item_id,
-                server=__extract_server(offer_item_tag),
-                seller=__extract_seller(offer_item_tag),
-                delivery_time=__extract_delivery_time(offer_item_tag),
-                min_stock=offers_model[offer_item_id].get("min_stock", None),
-                min_unit=offers_model[offer_item_id].get("min_unit", None),
-                quantity=__extract_quantity(offer_item_tag),
-                price=__extract_price(offer_item_tag),
-            )
-        )
-    for offer_item_tag in soup.select(".product-item"):
-        offer_item_id = __extract_offer_id(offer_item_tag)
-        offer_items.append(
-            OfferItem(
-                offer_id=offer_item_id,
-                server=__extract_server(offer_item_tag),
-                seller=__extract_seller(offer_item_tag),
-                delivery_time=__extract_delivery_time(offer_item_tag),
-                min_stock=offers_model[offer_item_id].get("min_stock", None),
-                min_unit=offers_model[offer_item_id].get("min_unit", None),
-                quantity=__extract_quantity(offer_item_tag),
-                price=__extract_price(offer_item_tag),
-            )
-        )
-        # Sleep interval
-        # time.sleep(random.uniform(1, 1.5))
+@retry(retries=3, delay=1.2, exception=(HTTPError, requests.ConnectionError, requests.Timeout), backoff=2, jitter=0.5)
+def __get_html_http(url: str) -> str | None:
+    """
+    Fetch the offer page without a browser.
+
+    :return: The page html, or None when the site answered with a challenge page.
+    """
+    rate_limiter.acquire(url)
+    res = _get_session().get(url, timeout=15)
+    if is_challenge_page(res.status_code, res.text, res.headers):
+        return None
+    res.raise_for_status()
+    return res.text
 
+
+def get_pa_fetch_mode() -> str:
+    return os.getenv("PA_FETCH_MODE", "http").strip().lower()
+
+
+def __extract_offer_items_from_html(html: str) -> list[OfferItem]:
+    with metrics.span("parse", source="pa"):
+        offers_model = __extract_min_unit_and_min_stock(html)
+        # Only the offer containers are built into a tree, offersModel is read from the raw html
+        soup = make_soup(html, OFFER_STRAINER)
+        return __extract_offer_items_from_soup(soup, offers_model)
+
+
+def __extract_offer_items_from_soup(soup: BeautifulSoup, offers_model: dict) -> list[OfferItem]:
+    offer_items = []
+    for offer_item_tag in soup.select(".offer-item") + soup.select(".product-item"):
+        offer_items.append(__extract_offer_item(offer_item_tag, offers_model))
     return offer_items
 
 
-def __extract_offer_id(
+def __extract_offer_item(
         tag: Tag,
+        offers_model: dict,
+) -> OfferItem:
+    fields = first_tags_by_class(tag, OFFER_FIELD_CLASSES)
+    offer_item_id = __extract_offer_id(fields)
+    return OfferItem(
+        offer_id=offer_item_id,
+        server=__extract_server(fields),
+        seller=__extract_seller(tag, fields),
+        delivery_time=__extract_delivery_time(fields),
+        min_stock=offers_model[offer_item_id].get("min_stock", None),
+        min_unit=offers_model[offer_item_id].get("min_unit", None),
+        quantity=__extract_quantity(fields),
+        price=__extract_price(fields),
+    )
+
+
+def __extract_offer_id(
+        fields: dict[str, Tag],
 ) -> str:
-    offer_id_tag = tag.select_one(".offerid")
+    offer_id_tag = fields.get("offerid")
     if offer_id_tag:
         return offer_id_tag.get_text(strip=True)
     raise PACrawlerError("Can't extract offer id")
 
 
 def __extract_server(
-        tag: Tag,
+        fields: dict[str, Tag],
 ) -> str:
-    offer_title_lv1_tag = tag.select_one(".offer-title-lv1")
-    offer_title_lv2_tag = tag.select_one(".offer-title-lv2")
+    offer_title_lv1_tag = fields.get("offer-title-lv1")
+    offer_title_lv2_tag = fields.get("offer-title-lv2")
 
     offer_title_lv1 = (
         offer_title_lv1_tag.get_text(strip=True) if offer_title_lv1_tag else ""
@@ -95,9 +192,10 @@ def __extract_seller_feedback_count(
 
 def __extract_seller(
         tag: Tag,
+        fields: dict[str, Tag],
 ) -> Seller:
     canGetFeedback = True
-    offer_seller_name_tag = tag.select_one(".username")
+    offer_seller_name_tag = fields.get("username")
     name = offer_seller_name_tag.get_text(strip=True) if offer_seller_name_tag else ""
     if name == "":
         try:
@@ -120,9 +218,9 @@ def __extract_seller(
 
 
 def __extract_delivery_time(
-        tag: Tag,
+        fields: dict[str, Tag],
 ) -> DeliveryTime:
-    delivery_text_tag = tag.select_one(".OLP-delivery-text")
+    delivery_text_tag = fields.get("OLP-delivery-text")
     if delivery_text_tag:
         delivery_text = delivery_text_tag.get_text(strip=True)
         delivery_splitted = delivery_text.split(" ")
@@ -134,9 +232,9 @@ def __extract_delivery_time(
 
 
 def __extract_price(
-        tag: Tag,
+        fields: dict[str, Tag],
 ) -> float:
-    price_tag = tag.select_one(".offer-price-tag")
+    price_tag = fields.get("offer-price-tag")
     if price_tag:
         price_txt = price_tag.get_text(strip=True).replace("$", "")
         return float(price_txt)
@@ -145,40 +243,94 @@ def __extract_price(
 
 
 def __extract_quantity(
-        tag: Tag,
+        fields: dict[str, Tag],
 ) -> int:
-    quan_tag = tag.select_one(".OLP-input-number")
+    quan_tag = fields.get("OLP-input-number")
     if quan_tag:
         return int(quan_tag.attrs["value"])
 
     raise PACrawlerError("Can't extract quantity")
 
 
-def __extract_min_unit_and_min_stock(
-        soup: BeautifulSoup,
-) -> dict:
+_OFFERS_MODEL_PATTERN = re.compile(r"offersModel\s*=\s*(?=[\[{])")
+_JSON_DECODER = json.JSONDecoder()
+
+
+def parse_offers_model(html: str) -> list[dict] | None:
+    """
+    Decode the ``var offersModel = [...]`` literal of an offer page as JSON.
+    The decoder stops at the end of the literal, so the rest of the script is never parsed.
+
+    :return: The offers, or None when the literal is missing or is not plain JSON.
+    """
+    match = _OFFERS_MODEL_PATTERN.search(html)
+    if match is None:
+        return None
+    try:
+        offers_model, _ = _JSON_DECODER.raw_decode(html, match.end())
+    except ValueError:
+        return None
+    return offers_model
+
+
+def eval_offers_model_execjs(soup: BeautifulSoup) -> list[dict] | None:
     for script_tag in soup.select("script"):
         if "varoffersModel" in script_tag.text.replace(" ", ""):
             ctx = execjs.compile(script_tag.text)
-            offers_model = ctx.eval("offersModel")
-            res_dict = {}
-            for offer_model in offers_model:
-                res_dict[str(offer_model["id"])] = {
-                    "min_unit": offer_model["currencyPerUnit"],
-                    "min_stock": offer_model["currencyPerUnit"]
-                                 * offer_model["minValue"],
-                }
-
-            return res_dict
-
-    raise PACrawlerError("Can't extract min_unit and min_stock")
+            return ctx.eval("offersModel")
+    return None
 
 
-@retry(5, delay=0.25, exception=PACrawlerError)
+def __extract_min_unit_and_min_stock(
+        html: str,
+) -> dict:
+    offers_model = parse_offers_model(html)
+    if offers_model is None:
+        # Not plain JSON (e.g. unquoted keys), let a JS runtime evaluate it
+        offers_model = eval_offers_model_execjs(make_soup(html, SoupStrainer("script")))
+    if offers_model is None:
+        raise PACrawlerError("Can't extract min_unit and min_stock")
+
+    res_dict = {}
+    for offer_model in offers_model:
+        res_dict[str(offer_model["id"])] = {
+            "min_unit": offer_model["currencyPerUnit"],
+            "min_stock": offer_model["currencyPerUnit"]
+                         * offer_model["minValue"],
+        }
+    return res_dict
+
+
+@retry(5, delay=0.25, exception=PACrawlerError, backoff=2, max_delay=5, jitter=0.5)
 def extract_offer_items(
         url: str,
-        browser: SeleniumUtil,
+        browser_pools: SeleniumPools | None = None,
 ) -> list[OfferItem]:
-    return __extract_offer_items_from_soup(
-        __get_soup(url, browser),
-    )
+    """
+    Offers of a PlayerAuctions listing. The page is fetched over plain HTTP
+    unless PA_FETCH_MODE=browser; a browser is only checked out of the pools
+    when the site answers with a challenge page, and its cookies are then
+    reused by the following HTTP fetches.
+    """
+    if get_pa_fetch_mode() != "browser":
+        try:
+            html = __get_html_http(url)
+        except (HTTPError, requests.ConnectionError, requests.Timeout) as e:
+            # Retried like any other failed row, instead of aborting the whole run
+            raise PACrawlerError(f"Error fetching {url}: {e}") from e
+        if html is not None:
+            return __extract_offer_items_from_html(html)
+        metrics.inc("pa_challenge_pages_total")
+        if browser_pools is None:
+            raise PACrawlerError(f"Challenge page for {url} and no browser to fall back to")
+        print(f"Challenge page for {url}, fall back to browser")
+    elif browser_pools is None:
+        raise PACrawlerError(f"PA_FETCH_MODE=browser but no browser to fetch {url} with")
+    with browser_pools.checkout(url) as browser:
+        html = __get_html(url, browser)
+        harvest_browser_session(browser)
+    return __extract_offer_items_from_html(html)
+
+
+def extract_offer_items_from_html(html: str) -> list[OfferItem]:
+    return __extract_offer_items_from_html(html)
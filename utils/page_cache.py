@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Hashable, TypeVar
+
+from cachetools import TTLCache
+
+from utils import metrics
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_CACHE_TTL = 120
+
+
+class PageCache:
+    """
+    Parsed competitor offer lists shared by every row that compares against the
+    same page. A key that is being fetched is not fetched again: later callers
+    wait for the fetch in flight and get its result. Failures are not cached.
+
+    :param ttl: Seconds a parsed page is reused.
+    :param metric_name: Prefix of the hit/miss/coalesced counters, so other caches built on this one count apart.
+    """
+
+    def __init__(self, ttl: float, metric_name: str = "page_cache") -> None:
+        self.metric_name = metric_name
+        self._lock = threading.Lock()
+        self._cache: TTLCache = TTLCache(maxsize=1024, ttl=ttl)
+        self._in_flight: dict[Hashable, Future] = {}
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], T], source: str = "") -> T:
+        with self._lock:
+            if key in self._cache:
+                metrics.inc(f"{self.metric_name}_hits_total", source=source)
+                return self._cache[key]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if not owner:
+            metrics.inc(f"{self.metric_name}_coalesced_total", source=source)
+            return future.result()
+
+        metrics.inc(f"{self.metric_name}_misses_total", source=source)
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._cache[key] = value
+            self._in_flight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+_page_cache_lock = threading.Lock()
+_page_cache: PageCache | None = None
+
+
+def get_page_cache() -> PageCache:
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            try:
+                ttl = float(os.getenv("PAGE_CACHE_TTL"))
+            except Exception:
+                ttl = DEFAULT_PAGE_CACHE_TTL
+            _page_cache = PageCache(ttl)
+        return _page_cache
+
+
+def cached_offers(source: str, url: str, fetch: Callable[[], list[T]], filters: list[str] | None = None) -> list[T]:
+    """
+    The offers of a page, fetched once per (source, url, filters) for
+    PAGE_CACHE_TTL seconds. Each caller gets its own list.
+
+    :param filters: Page filters that change the parsed offers (FUN).
+    """
+    key = (source, url, tuple(sorted(filters)) if filters else ())
+    return list(get_page_cache().get_or_fetch(key, fetch, source))
+
+
+def clear_page_cache() -> None:
+    """Drop every cached page, e.g. at the start of a cycle."""
+    get_page_cache().clear()
@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+import constants
+from model.crawl_model import OfferItem
+from model.payload import PriceInfo, Row
+
+DEFAULT_BATCH_SIZE = 500
+
+# Order of the per-source minima returned by calculate_price_stock_fake
+STOCK_FAKE_SOURCES = ("g2g", "fun", "bij", "dd", "sheet1", "sheet2", "sheet3", "sheet4")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    observed_at REAL NOT NULL,
+    cycle_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    product TEXT NOT NULL,
+    source TEXT NOT NULL,
+    url TEXT,
+    price REAL,
+    seller TEXT,
+    quantity INTEGER,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS observations_product_source_time
+    ON observations (product, source, observed_at);
+"""
+
+
+@dataclass
+class Observation:
+    """
+    One price seen for a row: a PA offer (source "pa", price per unit), a
+    competitor minimum, or the price we chose (source "chosen"). ``product`` is
+    the row_series_key of the row.
+    """
+    row_index: int
+    product: str
+    source: str
+    price: float | None
+    seller: str | None = None
+    url: str | None = None
+    quantity: int | None = None
+    details: dict = field(default_factory=dict)
+    observed_at: float = field(default_factory=time.time)
+
+
+def row_series_key(row: Row) -> str:
+    """
+    The product a row's observations are filed under: its Product_link, which
+    names game, server and faction. SPECIAL rows share one Product_link and are
+    told apart by the game list they price.
+    """
+    product = row.product.Product_link
+    if "SPECIAL" in product:
+        extra = row.extra
+        return f"{product}|{extra.GAME_LIST_SHEET_ID}|'{extra.GAME_LIST_SHEET}'!{extra.GAME_LIST_CELLS}"
+    return product
+
+
+def row_observations(
+        row: Row,
+        offer_items: list[OfferItem],
+        item_info: PriceInfo,
+        stock_fake_items: list | None,
+) -> list[Observation]:
+    """Everything a priced row learned this cycle."""
+    product = row_series_key(row)
+    observed_at = time.time()
+    observations = [
+        Observation(
+            row_index=row.row_index,
+            product=product,
+            source="pa",
+            price=offer_item.price / offer_item.quantity if offer_item.quantity else None,
+            seller=offer_item.seller.name if offer_item.seller else None,
+            url=row.product.PRODUCT_COMPARE,
+            quantity=offer_item.quantity,
+            details={"offer_id": offer_item.offer_id, "min_unit": offer_item.min_unit},
+            observed_at=observed_at,
+        )
+        for offer_item in offer_items
+    ]
+    if stock_fake_items:
+        source_urls = {
+            "g2g": row.g2g.G2G_PRODUCT_COMPARE,
+            "fun": row.fun.FUN_PRODUCT_COMPARE,
+            "dd": row.dd.DD_PRODUCT_COMPARE,
+        }
+        for source, price in zip(STOCK_FAKE_SOURCES, stock_fake_items):
+            if price is None:
+                continue
+            observations.append(Observation(
+                row_index=row.row_index,
+                product=product,
+                source=source,
+                price=price[0],
+                seller=price[1],
+                url=source_urls.get(source),
+                observed_at=observed_at,
+            ))
+    observations.append(Observation(
+        row_index=row.row_index,
+        product=product,
+        source="chosen",
+        price=item_info.adjusted_price,
+        seller=item_info.ref_seller,
+        details={
+            "stock_type": item_info.stock_type.name,
+            "price_min": item_info.price_min,
+            "price_max": item_info.price_mac,
+            "ref_price": item_info.ref_price,
+        },
+        observed_at=observed_at,
+    ))
+    return observations
+
+
+class PriceHistory:
+    """
+    Append-only SQLite (WAL) store of every observation. Observations are
+    buffered and inserted batch_size at a time in one transaction.
+
+    :param path: Database file.
+    :param batch_size: Buffered observations that trigger an insert.
+    """
+
+    def __init__(self, path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.cycle_id = ""
+        self._lock = threading.Lock()
+        self._pending: list[Observation] = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def start_cycle(self) -> None:
+        self.cycle_id = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def record(self, observations: list[Observation]) -> None:
+        with self._lock:
+            self._pending.extend(observations)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        rows = [
+            (
+                o.observed_at, self.cycle_id, o.row_index, o.product, o.source, o.url,
+                o.price, o.seller, o.quantity, json.dumps(o.details, ensure_ascii=False) if o.details else None,
+            )
+            for o in self._pending
+        ]
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO observations (observed_at, cycle_id, row_index, product, source, url,"
+                " price, seller, quantity, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        self._pending.clear()
+
+    def price_trend(self, product: str, source: str, since: float | None = None) -> list[tuple[float, float, str]]:
+        """(observed_at, price, seller) of a product and source, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT observed_at, price, seller FROM observations"
+                " WHERE product = ? AND source = ? AND observed_at >= ? ORDER BY observed_at",
+                (product, source, since or 0),
+            ).fetchall()
+
+    def latest(self, product: str, source: str) -> tuple[float, float, str] | None:
+        """The most recent (observed_at, price, seller) of a product and source."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT observed_at, price, seller FROM observations"
+                " WHERE product = ? AND source = ? ORDER BY observed_at DESC LIMIT 1",
+                (product, source),
+            ).fetchone()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+_history_lock = threading.Lock()
+_history: PriceHistory | None = None
+_history_checked = False
+
+
+def get_price_history() -> PriceHistory | None:
+    """
+    The store at PRICE_HISTORY_PATH (default constants.PRICE_HISTORY_PATH), or
+    None when PRICE_HISTORY_PATH is set empty or the file can't be opened.
+    """
+    global _history, _history_checked
+    with _history_lock:
+        if not _history_checked:
+            _history_checked = True
+            path = os.getenv("PRICE_HISTORY_PATH", constants.PRICE_HISTORY_PATH)
+            if path:
+                try:
+                    batch_size = int(os.getenv("PRICE_HISTORY_BATCH_SIZE"))
+                except Exception:
+                    batch_size = DEFAULT_BATCH_SIZE
+                try:
+                    _history = PriceHistory(path, batch_size)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Can't open price history {path}: {e}")
+        return _history
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from utils import metrics
+
+# Scraped site -> prefix of its settings: RATE_LIMIT_<PREFIX> (requests per
+# second) and RATE_LIMIT_<PREFIX>_BURST (requests allowed back to back)
+SITES = {
+    "playerauctions.com": "PA",
+    "g2g.com": "G2G",
+    "funpay.com": "FUN",
+    "dd373.com": "DD",
+    "bijiaqi.com": "BIJ",
+}
+
+
+class TokenBucket:
+    """
+    ``rate`` requests per second on average, up to ``burst`` at once.
+
+    A caller reserves a token and then waits outside the lock until it is due,
+    so threads and coroutines share one bucket and are served in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token.
+
+        :return: Seconds to wait before the request may be sent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """Token buckets per site, built from settings.env; hosts without a limit are not throttled."""
+
+    def __init__(self, sites: dict[str, str] = SITES) -> None:
+        self.buckets: dict[str, TokenBucket] = {}
+        for domain, prefix in sites.items():
+            try:
+                rate = float(os.getenv(f"RATE_LIMIT_{prefix}"))
+            except Exception:
+                continue
+            if rate <= 0:
+                continue
+            try:
+                burst = int(os.getenv(f"RATE_LIMIT_{prefix}_BURST"))
+            except Exception:
+                burst = 1
+            self.buckets[domain] = TokenBucket(rate, burst)
+
+    def for_url(self, url: str) -> tuple[str, TokenBucket] | tuple[None, None]:
+        hostname = urlparse(url).hostname or ""
+        for domain, bucket in self.buckets.items():
+            if hostname == domain or hostname.endswith(f".{domain}"):
+                return domain, bucket
+        return None, None
+
+
+_limiter_lock = threading.Lock()
+_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def _reserve(url: str) -> float:
+    domain, bucket = get_rate_limiter().for_url(url)
+    if bucket is None:
+        return 0
+    delay = bucket.reserve()
+    if delay > 0:
+        metrics.observe("rate_limit_wait_seconds", delay, site=domain)
+    return delay
+
+
+def acquire(url: str) -> None:
+    """Block until a request to ``url`` is allowed by its site's bucket."""
+    delay = _reserve(url)
+    if delay > 0:
+        time.sleep(delay)
+
+
+async def acquire_async(url: str) -> None:
+    """acquire() for coroutines: waits without blocking the event loop."""
+    delay = _reserve(url)
+    if delay > 0:
+        await asyncio.sleep(delay)
@@ -0,0 +1,36 @@
+from collections import defaultdict
+
+from model.payload import Row
+from utils.google_api import prefetch_ranges, clear_prefetched_ranges
+
+
+def collect_reference_ranges(rows: list[Row]) -> dict[str, list[str]]:
+    """
+    Group every external (spreadsheet id, range) referenced by the rows by spreadsheet.
+    """
+    grouped: dict[str, list[str]] = defaultdict(list)
+    for row in rows:
+        for model in [row.product, row.stock_info, row.extra, row.s1, row.s2, row.s3, row.s4]:
+            for spreadsheet_id, range_name in model.reference_cells():
+                if range_name not in grouped[spreadsheet_id]:
+                    grouped[spreadsheet_id].append(range_name)
+    return dict(grouped)
+
+
+def resolve_reference_cells(rows: list[Row]) -> int:
+    """
+    Prefetch the min/max/stock/price cells and game lists of all rows with one batchGet per
+    spreadsheet. A spreadsheet that fails (e.g. a wrong sheet name in one of
+    its ranges) is skipped and its cells are read one by one as before.
+
+    :return: Number of spreadsheets prefetched.
+    """
+    clear_prefetched_ranges()
+    resolved = 0
+    for spreadsheet_id, ranges in collect_reference_ranges(rows).items():
+        try:
+            prefetch_ranges(spreadsheet_id, ranges)
+            resolved += 1
+        except Exception as e:
+            print(f"Error prefetching {len(ranges)} cells from {spreadsheet_id}: {e}")
+    return resolved
@@ -1,5 +1,11 @@
+import os
 import pathlib
+import queue
+import threading
 import time
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import urlparse
 
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException
@@ -18,10 +24,18 @@ PATH_TO_EXTENSION = pathlib.Path(__file__).parent.parent.joinpath(
 
 
 class SeleniumUtil:
-    def __init__(self, mode: int):
+    def __init__(self, mode: int, user_data_dir: str | None = None):
+        """
+        :param mode: 1 windowed with the captcha extension, 2 headless.
+        :param user_data_dir: Chrome profile directory to keep cookies and logins in across launches.
+        """
+        self.mode = mode
+        self.page_count = 0
         _driver_path = ChromeDriverManager().install()
         _chrome_service = Service(executable_path=_driver_path)
         _chrome_options = webdriver.ChromeOptions()
+        if user_data_dir:
+            _chrome_options.add_argument(f"--user-data-dir={os.path.abspath(user_data_dir)}")
         _retry_time = constants.RETRIES_TIME
         self.driver = None
         if mode == 1:
@@ -54,6 +68,7 @@ class SeleniumUtil:
 
     def get(self, url):
         try:
+            self.page_count += 1
             self.driver.get(url)
         except WebDriverException as e:
             print(f"Error navigating to {url}: {e}")
@@ -67,7 +82,148 @@ class SeleniumUtil:
         self.driver.execute_script("arguments[0].scrollIntoView(true);", element)
         element.click()
 
+    def is_healthy(self) -> bool:
+        if self.driver is None:
+            return False
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except WebDriverException:
+            return False
+
     def close(self):
         self.driver.close()
         self.driver.quit()
         self.driver = None
+
+
+def is_driver_error(error: BaseException | None) -> bool:
+    """Whether a WebDriverException raised the error, possibly wrapped by the caller."""
+    while error is not None:
+        if isinstance(error, WebDriverException):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class SeleniumPool:
+    """
+    Up to ``size`` SeleniumUtil drivers handed out one caller at a time. Drivers
+    are started on first use, so a pool nothing checks out from opens no browser.
+
+    A driver is replaced on checkout when it fails its health check or has
+    loaded ``max_pages`` pages, and when a WebDriverException (possibly wrapped
+    by the caller) was raised while it was checked out or it fails its health
+    check afterwards. Other errors, like a page that does not parse, keep it.
+    A driver that can't be replaced is dropped and started again on a later
+    checkout.
+    """
+
+    def __init__(
+            self,
+            mode: int,
+            size: int = 1,
+            max_pages: int = 200,
+            minimize: bool = False,
+    ):
+        self.mode = mode
+        self.size = size
+        self.max_pages = max_pages
+        self.minimize = minimize
+        self._idle: queue.Queue[SeleniumUtil] = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _new_browser(self) -> SeleniumUtil:
+        browser = SeleniumUtil(mode=self.mode)
+        if self.minimize:
+            browser.driver.minimize_window()
+        return browser
+
+    def _start_browser(self) -> SeleniumUtil:
+        """Start a driver in a slot already counted in ``_started``; the slot is given back on failure."""
+        try:
+            return self._new_browser()
+        except BaseException:
+            with self._lock:
+                self._started -= 1
+            raise
+
+    def _recycle(self, browser: SeleniumUtil) -> SeleniumUtil:
+        try:
+            browser.close()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+        return self._start_browser()
+
+    def _get_browser(self, timeout: float | None) -> SeleniumUtil:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                start = self._started < self.size
+                if start:
+                    self._started += 1
+            if start:
+                return self._start_browser()
+            # Wake up now and then: a dropped driver frees a slot without anything being put back
+            wait = 1.0 if deadline is None else min(1.0, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                return self._idle.get(timeout=wait)
+            except queue.Empty:
+                pass
+
+    @contextmanager
+    def checkout(self, timeout: float | None = None) -> Iterator[SeleniumUtil]:
+        browser = self._get_browser(timeout)
+        try:
+            if browser.page_count >= self.max_pages or not browser.is_healthy():
+                browser, old = None, browser
+                browser = self._recycle(old)
+            yield browser
+        except Exception as e:
+            if browser is not None and (is_driver_error(e) or not browser.is_healthy()):
+                browser, old = None, browser
+                try:
+                    browser = self._recycle(old)
+                except Exception as recycle_error:
+                    print(f"Error restarting browser: {recycle_error}")
+            raise
+        finally:
+            if browser is not None:
+                self._idle.put(browser)
+
+    def close(self):
+        while not self._idle.empty():
+            try:
+                self._idle.get_nowait().close()
+            except Exception as e:
+                print(f"Error closing browser: {e}")
+
+
+class SeleniumPools:
+    """Browser pools assigned by domain, e.g. PlayerAuctions and bijiaqi get their own drivers."""
+
+    def __init__(self, pools: dict[str, SeleniumPool], default: str | None = None):
+        self.pools = pools
+        self.default = default
+
+    def for_url(self, url: str) -> SeleniumPool:
+        hostname = urlparse(url).hostname or ""
+        for domain, pool in self.pools.items():
+            if hostname == domain or hostname.endswith(f".{domain}"):
+                return pool
+        if self.default is not None:
+            return self.pools[self.default]
+        raise KeyError(f"No browser pool for {url}")
+
+    def checkout(self, url: str, timeout: float | None = None):
+        return self.for_url(url).checkout(timeout=timeout)
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
@@ -1,3 +1,5 @@
+import threading
+import time
 from datetime import datetime
 
 import gspread.urls
@@ -6,6 +8,7 @@ import gspread
 from typing import Type, Any, TypeVar
 
 from model.sheet_model import BaseGSheetModel
+from utils import metrics
 from pydantic import BaseModel, ValidationError
 
 T = TypeVar("T", bound=BaseGSheetModel)
@@ -78,6 +81,14 @@ def query_multi_model_from_worksheet(
                 f"{proper.metadata[0]}{row_index}",
             )
     query_values = [value.first() for value in worksheet.batch_get(cells)]
+    return _build_multi_model(models, query_values, row_index)
+
+
+def _build_multi_model(
+    models: list[Type[T]],
+    query_values: list[Any],
+    row_index: int,
+) -> list[Type[T]]:
     result_model = []
     count: int = 0
     for i, model in enumerate(models):
@@ -95,6 +106,68 @@ def query_multi_model_from_worksheet(
     return result_model
 
 
+def _column_index(column: str) -> int:
+    return gspread.utils.a1_to_rowcol(f"{column}1")[1]
+
+
+def _contiguous_row_ranges(row_indexes: list[int]) -> list[tuple[int, int]]:
+    ranges: list[tuple[int, int]] = []
+    for index in sorted(set(row_indexes)):
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], index)
+        else:
+            ranges.append((index, index))
+    return ranges
+
+
+def load_rows_snapshot(
+    worksheet: gspread.worksheet.Worksheet,
+    row_indexes: list[int],
+    first_col: str = "B",
+    last_col: str = "DZ",
+    max_ranges_per_call: int = 200,
+) -> dict[int, list[Any]]:
+    """
+    Fetch the first_col:last_col block of every given row with as few
+    values.batchGet calls as possible (one range per run of consecutive rows).
+
+    :return: row index -> list of cell values, position 0 being first_col.
+    """
+    width = _column_index(last_col) - _column_index(first_col) + 1
+    row_ranges = _contiguous_row_ranges(row_indexes)
+    snapshot: dict[int, list[Any]] = {}
+    for start in range(0, len(row_ranges), max_ranges_per_call):
+        chunk = row_ranges[start:start + max_ranges_per_call]
+        value_ranges = worksheet.batch_get(
+            [f"{first_col}{first}:{last_col}{last}" for first, last in chunk]
+        )
+        for (first, last), value_range in zip(chunk, value_ranges):
+            for offset, index in enumerate(range(first, last + 1)):
+                values = value_range[offset] if offset < len(value_range) else []
+                # Single-cell reads return None for blank cells, keep the same here
+                row_values = [value if value != "" else None for value in values]
+                row_values.extend([None] * (width - len(row_values)))
+                snapshot[index] = row_values[:width]
+    return snapshot
+
+
+def query_multi_model_from_snapshot(
+    snapshot_row: list[Any],
+    models: list[Type[T]],
+    row_index: int,
+    first_col: str = "B",
+) -> list[Type[T]]:
+    first_col_index = _column_index(first_col)
+    query_values = []
+    for model in models:
+        for _, proper in model.fields_exclude_row_index().items():
+            position = _column_index(proper.metadata[0]) - first_col_index
+            query_values.append(
+                snapshot_row[position] if 0 <= position < len(snapshot_row) else None
+            )
+    return _build_multi_model(models, query_values, row_index)
+
+
 def update_string_to_worksheet(
     worksheet: gspread.worksheet.Worksheet,
     cell: str,
@@ -102,3 +175,49 @@ def update_string_to_worksheet(
 ) -> None:
     worksheet.update(cell, value)
 
+
+class WorksheetWriteBuffer:
+    """
+    Collect single-cell updates and send them with one worksheet.batch_update.
+
+    :param flush_interval: If > 0, flush automatically when this many seconds
+        passed since the last flush, so progress stays visible on long sheets.
+    """
+
+    def __init__(
+        self,
+        worksheet: gspread.worksheet.Worksheet,
+        flush_interval: float = 0,
+    ) -> None:
+        self.worksheet = worksheet
+        self.flush_interval = flush_interval
+        self._pending: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, cell: str, value: Any) -> None:
+        with self._lock:
+            # A later write to the same cell replaces the earlier one
+            self._pending.pop(cell, None)
+            self._pending[cell] = value
+            is_due = self.flush_interval > 0 and time.monotonic() - self._last_flush >= self.flush_interval
+        if is_due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        data = [{"range": cell, "values": [[value]]} for cell, value in pending.items()]
+        try:
+            with metrics.span("log_write", details={"cells": len(data)}):
+                # Same parsing of dates and numbers as update_cell
+                self.worksheet.batch_update(data, value_input_option=gspread.utils.ValueInputOption.user_entered)
+        except Exception:
+            with self._lock:
+                # Keep the cells for the next flush, unless they were written again meanwhile
+                pending.update(self._pending)
+                self._pending = pending
+            raise